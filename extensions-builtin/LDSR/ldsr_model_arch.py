@@ -12,20 +12,30 @@ import safetensors.torch
 
 from ldm.models.diffusion.ddim import DDIMSampler
 from ldm.util import instantiate_from_config, ismap
-from modules import shared, sd_hijack, devices
+from modules import shared, sd_hijack, devices, modelloader
 
 cached_ldsr_model: torch.nn.Module = None
+cached_ldsr_key = None
 
 
 # Create LDSR Class
 class LDSR:
     def load_model_from_config(self, half_attention):
-        global cached_ldsr_model
+        global cached_ldsr_model, cached_ldsr_key
 
-        if shared.opts.ldsr_cached and cached_ldsr_model is not None:
+        key = (self.modelPath, os.path.getmtime(self.modelPath), half_attention)
+
+        if shared.opts.ldsr_cached and cached_ldsr_model is not None and cached_ldsr_key == key:
             print("Loading model from cache")
             model: torch.nn.Module = cached_ldsr_model
+            model.to(shared.device)
         else:
+            # a model cached with other settings is not going to be used again
+            cached_ldsr_model = None
+            cached_ldsr_key = None
+            gc.collect()
+            devices.torch_gc()
+
             print(f"Loading model from {self.modelPath}")
             _, extension = os.path.splitext(self.modelPath)
             if extension.lower() == ".safetensors":
@@ -48,9 +58,23 @@ class LDSR:
 
             if shared.opts.ldsr_cached:
                 cached_ldsr_model = model
+                cached_ldsr_key = key
 
         return {"model": model}
 
+    @staticmethod
+    def release_model(model):
+        """
+        Called after every upscale. The cached model stays on GPU between upscales only if its size fits into VRAM
+        budget from settings; otherwise it is moved to RAM and moved back to GPU for the next upscale.
+        """
+
+        if not shared.opts.ldsr_cached or model is not cached_ldsr_model:
+            return
+
+        if modelloader.model_size_in_bytes(model) > shared.opts.ldsr_cache_vram_size * 1024 * 1024:
+            model.to(devices.cpu)
+
     def __init__(self, model_path, yaml_path):
         self.modelPath = model_path
         self.yamlPath = yaml_path
@@ -134,7 +158,12 @@ class LDSR:
         pad_w, pad_h = np.max(((2, 2), np.ceil(np.array(im_og.size) / 64).astype(int)), axis=0) * 64 - im_og.size
         im_padded = Image.fromarray(np.pad(np.array(im_og), ((0, pad_h), (0, pad_w), (0, 0)), mode='edge'))
 
-        logs = self.run(model["model"], im_padded, diffusion_steps, eta)
+        try:
+            # in half precision, weights are float16 while inputs and noise are created as float32
+            with devices.autocast(disable=not half_attention):
+                logs = self.run(model["model"], im_padded, diffusion_steps, eta)
+        finally:
+            self.release_model(model["model"])
 
         sample = logs["sample"]
         sample = sample.detach().cpu()
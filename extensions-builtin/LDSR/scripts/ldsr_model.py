@@ -3,10 +3,19 @@ import os
 from modules.modelloader import load_file_from_url
 from modules.upscaler import Upscaler, UpscalerData
 from ldsr_model_arch import LDSR
-from modules import shared, script_callbacks, errors
+import torch
+
+from modules import shared, script_callbacks, errors, devices
 import sd_hijack_autoencoder  # noqa: F401
 import sd_hijack_ddpm_v1  # noqa: F401
 
+ldsr_presets = {
+    "Fast": 25,
+    "Balanced": 50,
+    "Quality": 100,
+}
+"""{preset name: number of DDIM steps}; with "Custom" preset, number of steps is taken from settings"""
+
 
 class UpscalerLDSR(Upscaler):
     def __init__(self, user_path):
@@ -54,15 +63,19 @@ class UpscalerLDSR(Upscaler):
         except Exception:
             errors.report(f"Failed loading LDSR model {path}", exc_info=True)
             return img
-        ddim_steps = shared.opts.ldsr_steps
-        return ldsr.super_resolution(img, ddim_steps, self.scale)
+        ddim_steps = ldsr_presets.get(shared.opts.ldsr_preset, shared.opts.ldsr_steps)
+        half_attention = shared.opts.ldsr_half and devices.device.type == "cuda" and devices.dtype_inference == torch.float16
+        return ldsr.super_resolution(img, ddim_steps, self.scale, half_attention=half_attention)
 
 
 def on_ui_settings():
     import gradio as gr
 
+    shared.opts.add_option("ldsr_preset", shared.OptionInfo("Custom", "LDSR quality preset", gr.Radio, {"choices": ["Custom", *ldsr_presets]}, section=('upscaling', "Upscaling")).info(", ".join(f"{name} = {steps} steps" for name, steps in ldsr_presets.items()) + "; Custom = use processing steps below"))
     shared.opts.add_option("ldsr_steps", shared.OptionInfo(100, "LDSR processing steps. Lower = faster", gr.Slider, {"minimum": 1, "maximum": 200, "step": 1}, section=('upscaling', "Upscaling")))
+    shared.opts.add_option("ldsr_half", shared.OptionInfo(False, "Run LDSR in half precision", section=('upscaling', "Upscaling")).info("faster and uses less VRAM on NVIDIA GPUs; requires the model to be loaded again"))
     shared.opts.add_option("ldsr_cached", shared.OptionInfo(False, "Cache LDSR model in memory", gr.Checkbox, {"interactive": True}, section=('upscaling', "Upscaling")))
+    shared.opts.add_option("ldsr_cache_vram_size", shared.OptionInfo(4096, "VRAM for keeping cached LDSR model on GPU between upscales (MB)", gr.Slider, {"minimum": 0, "maximum": 8192, "step": 64}, section=('upscaling', "Upscaling")).info("a cached model larger than this is moved to RAM after each upscale, freeing VRAM for generation; 0 = always move"))
 
 
 script_callbacks.on_ui_settings(on_ui_settings)
@@ -22,8 +22,6 @@ class ExtraNetworksPageLora(ui_extra_networks.ExtraNetworksPage):
 
         path, ext = os.path.splitext(lora_on_disk.filename)
 
-        alias = lora_on_disk.get_alias()
-
         search_terms = [self.search_terms_from_path(lora_on_disk.filename)]
         if lora_on_disk.hash:
             search_terms.append(lora_on_disk.hash)
@@ -40,25 +38,11 @@ class ExtraNetworksPageLora(ui_extra_networks.ExtraNetworksPage):
             "sd_version": lora_on_disk.sd_version.name,
         }
 
-        self.read_user_metadata(item)
-        activation_text = item["user_metadata"].get("activation text")
-        preferred_weight = item["user_metadata"].get("preferred weight", 0.0)
-        item["prompt"] = quote_js(f"<lora:{alias}:") + " + " + (str(preferred_weight) if preferred_weight else "opts.extra_networks_default_multiplier") + " + " + quote_js(">")
-
-        if activation_text:
-            item["prompt"] += " + " + quote_js(" " + activation_text)
-
-        negative_prompt = item["user_metadata"].get("negative text")
-        item["negative_prompt"] = quote_js("")
-        if negative_prompt:
-            item["negative_prompt"] = quote_js('(' + negative_prompt + ':1)')
+        # filtering by SD version needs user metadata right away; otherwise it is read when the card is shown
+        if not self.is_deferring_details() or (enable_filter and not shared.opts.lora_show_all):
+            self.read_user_metadata(item)
 
-        sd_version = item["user_metadata"].get("sd version")
-        if sd_version in network.SdVersion.__members__:
-            item["sd_version"] = sd_version
-            sd_version = network.SdVersion[sd_version]
-        else:
-            sd_version = lora_on_disk.sd_version
+        sd_version = self.apply_user_metadata(item, lora_on_disk)
 
         if shared.opts.lora_show_all or not enable_filter:
             pass
@@ -75,6 +59,44 @@ class ExtraNetworksPageLora(ui_extra_networks.ExtraNetworksPage):
 
         return item
 
+    def apply_user_metadata(self, item, lora_on_disk):
+        """Sets prompts for the item from its user metadata, and returns the SD version of the network."""
+
+        user_metadata = item.get("user_metadata", {})
+        activation_text = user_metadata.get("activation text")
+        preferred_weight = user_metadata.get("preferred weight", 0.0)
+        item["prompt"] = quote_js(f"<lora:{lora_on_disk.get_alias()}:") + " + " + (str(preferred_weight) if preferred_weight else "opts.extra_networks_default_multiplier") + " + " + quote_js(">")
+
+        if activation_text:
+            item["prompt"] += " + " + quote_js(" " + activation_text)
+
+        negative_prompt = user_metadata.get("negative text")
+        item["negative_prompt"] = quote_js("")
+        if negative_prompt:
+            item["negative_prompt"] = quote_js('(' + negative_prompt + ':1)')
+
+        sd_version = user_metadata.get("sd version")
+        if sd_version in network.SdVersion.__members__:
+            item["sd_version"] = sd_version
+            return network.SdVersion[sd_version]
+
+        return lora_on_disk.sd_version
+
+    def read_item_description(self, item):
+        super().read_item_description(item)
+
+        lora_on_disk = networks.available_networks.get(item["name"])
+        if lora_on_disk is not None:
+            self.apply_user_metadata(item, lora_on_disk)
+
+    def read_item_preview(self, item):
+        super().read_item_preview(item)
+
+        lora_on_disk = networks.available_networks.get(item["name"])
+        if item["preview"] is None and lora_on_disk is not None:
+            path, _ = os.path.splitext(item["filename"])
+            item["preview"] = self.find_embedded_preview(path, item["name"], lora_on_disk.metadata)
+
     def list_items(self):
         # instantiate a list to protect against concurrent modification
         names = list(networks.available_networks)
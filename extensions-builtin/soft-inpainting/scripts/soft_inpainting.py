@@ -251,6 +251,104 @@ def weighted_histogram_filter(img, kernel, kernel_center, percentile_min=0.0, pe
     weighted mean, median, maximum, and minimum filters
     parametrically using an arbitrary kernel.
 
+    Same as weighted_histogram_filter_reference, but computed for
+    all pixels at once with NumPy instead of one pixel at a time.
+
+    Args:
+        img (nparray):
+            The image, a 2-D array of floats, to which the filter is being applied.
+        kernel (nparray):
+            The kernel, a 2-D array of floats.
+        kernel_center (nparray):
+            The kernel center coordinate, a 1-D array with two elements.
+        percentile_min (float):
+            The lower bound of the histogram window used by the filter,
+            from 0 to 1.
+        percentile_max (float):
+            The upper bound of the histogram window used by the filter,
+            from 0 to 1.
+        min_width (float):
+            The minimum size of the histogram window bounds, in weight units.
+            Must be greater than 0.
+
+    Returns:
+        (nparray): A filtered copy of the input image "img", a 2-D array of floats.
+    """
+
+    height, width = img.shape
+    kernel_h, kernel_w = kernel.shape
+    center_y, center_x = (int(x) for x in np.broadcast_to(kernel_center, (2,)))
+    padding = ((center_y, kernel_h - 1 - center_y), (center_x, kernel_w - 1 - center_x))
+
+    # Pixels outside the image get zero weight, which leaves them out of the histogram.
+    padded_img = np.pad(img.astype(np.float64), padding)
+    padded_inside = np.pad(np.ones(img.shape), padding)
+
+    img_out = img.copy()
+
+    # Limit the memory used for windows to about 4M elements at a time.
+    kernel_size = kernel_h * kernel_w
+    rows_per_chunk = max(1, 4 * 1024 * 1024 // (width * kernel_size))
+
+    for row in range(0, height, rows_per_chunk):
+        row_end = min(height, row + rows_per_chunk)
+        rows = slice(row, row_end + kernel_h - 1)
+
+        # (rows, width, kernel_size) arrays of the values in each pixel's window and their weights.
+        values = np.lib.stride_tricks.sliding_window_view(padded_img[rows], (kernel_h, kernel_w))
+        values = values.reshape(row_end - row, width, kernel_size)
+        weights = np.lib.stride_tricks.sliding_window_view(padded_inside[rows], (kernel_h, kernel_w))
+        weights = (weights * kernel).reshape(row_end - row, width, kernel_size)
+
+        order = np.argsort(values, axis=-1, kind="stable")
+        values = np.take_along_axis(values, order, axis=-1)
+        weights = np.take_along_axis(weights, order, axis=-1)
+
+        # Each sample's range in the stack of weights.
+        sample_max = np.cumsum(weights, axis=-1)
+        sample_min = np.concatenate([np.zeros_like(sample_max[..., :1]), sample_max[..., :-1]], axis=-1)
+        total = sample_max[..., -1]
+
+        window_min = total * percentile_min
+        window_max = total * percentile_max
+
+        # Ensure the window is within the stack and at least a certain size.
+        narrow = window_max - window_min < min_width
+        window_center = (window_min + window_max) / 2
+        narrow_min = window_center - min_width / 2
+        narrow_max = window_center + min_width / 2
+
+        above = narrow_max > total
+        narrow_max = np.where(above, total, narrow_max)
+        narrow_min = np.where(above, total - min_width, narrow_min)
+
+        below = narrow_min < 0
+        narrow_min = np.where(below, 0, narrow_min)
+        narrow_max = np.where(below, min_width, narrow_max)
+
+        window_min = np.where(narrow, narrow_min, window_min)[..., None]
+        window_max = np.where(narrow, narrow_max, window_max)[..., None]
+
+        # Weighted average of all the samples that overlap with the window,
+        # weighted by the size of their overlap.
+        overlap = np.clip(np.minimum(window_max, sample_max) - np.maximum(window_min, sample_min), 0, None)
+        value = np.sum(values * overlap, axis=-1)
+        value_weight = np.sum(overlap, axis=-1)
+
+        img_out[row:row_end] = np.divide(value, value_weight, out=np.zeros_like(value), where=value_weight != 0)
+
+    return img_out
+
+
+def weighted_histogram_filter_reference(img, kernel, kernel_center, percentile_min=0.0, percentile_max=1.0, min_width=1.0):
+    """
+    Generalization convolution filter capable of applying
+    weighted mean, median, maximum, and minimum filters
+    parametrically using an arbitrary kernel.
+
+    Computes one pixel at a time; too slow for use on large images,
+    kept as a reference for weighted_histogram_filter.
+
     Args:
         img (nparray):
             The image, a 2-D array of floats, to which the filter is being applied.
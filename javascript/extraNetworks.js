@@ -48,7 +48,23 @@ function setupExtraNetworksForTab(tabname) {
             return; // `return` is equivalent of `continue` but for forEach loops.
         }
 
+        var paginatedCards = function() {
+            return gradioApp().querySelector('#' + tabname_full + "_cards > .extra-network-cards-sentinel");
+        };
+
+        var cardsLoader = null;
+
         var applyFilter = function(force) {
+            extraNetworksLoadTreeView(tabname, tabname_full.substring(tabname.length + 1));
+
+            if (paginatedCards()) {
+                if (!cardsLoader) {
+                    cardsLoader = extraNetworksPaginatedCardsLoader(tabname, tabname_full, search, sort_dir);
+                }
+                cardsLoader.reload(force);
+                return;
+            }
+
             var searchTerm = search.value.toLowerCase();
             gradioApp().querySelectorAll('#' + tabname + '_extra_tabs div.card').forEach(function(elem) {
                 var searchOnly = elem.querySelector('.search_only');
@@ -71,6 +87,11 @@ function setupExtraNetworksForTab(tabname) {
         };
 
         var applySort = function(force) {
+            if (paginatedCards()) {
+                applyFilter(force);
+                return;
+            }
+
             var cards = gradioApp().querySelectorAll('#' + tabname_full + ' div.card');
             var parent = gradioApp().querySelector('#' + tabname_full + "_cards");
             var reverse = sort_dir.dataset.sortdir == "Descending";
@@ -108,7 +129,14 @@ function setupExtraNetworksForTab(tabname) {
             parent.appendChild(frag);
         };
 
+        var searchTimeout = null;
         search.addEventListener("input", function() {
+            if (paginatedCards()) {
+                // every keystroke would otherwise be a request to the server
+                clearTimeout(searchTimeout);
+                searchTimeout = setTimeout(applyFilter, 250);
+                return;
+            }
             applyFilter();
         });
         applySort();
@@ -128,6 +156,132 @@ function setupExtraNetworksForTab(tabname) {
     registerPrompt(tabname, tabname + "_neg_prompt");
 }
 
+function extraNetworksPaginatedCardsLoader(tabname, tabname_full, search, sort_dir) {
+    /**
+     * Loads cards for a page in chunks from `/sd_extra_networks/cards` as the user scrolls.
+     *
+     * Only cards that have been scrolled into view (plus one page of lookahead) are ever
+     * requested and added to the DOM. Searching and sorting is done on the server.
+     *
+     * @param tabname       The name of the active tab in the sd webui. Ex: txt2img, img2img, etc.
+     * @param tabname_full  The id of the extraNetworks page. Ex: txt2img_lora.
+     * @param search        The search input element of the page.
+     * @param sort_dir      The sort direction element of the page.
+     */
+    var generation = 0;
+    var offset = 0;
+    var total = null;
+    var loading = false;
+    var lastQuery = null;
+    var observedSentinel = null;
+    var observer = null;
+
+    function sentinel() {
+        return gradioApp().querySelector('#' + tabname_full + "_cards > .extra-network-cards-sentinel");
+    }
+
+    function query() {
+        var elem = sentinel();
+        var activeSearchElem = gradioApp().querySelector('#' + tabname_full + "_controls .extra-network-control--sort.extra-network-control--enabled");
+        return {
+            page: elem.dataset.page,
+            tabname: tabname,
+            search: search.value,
+            sort: activeSearchElem ? activeSearchElem.dataset.sortkey : "default",
+            sortdir: sort_dir.dataset.sortdir,
+        };
+    }
+
+    function loadMore() {
+        var elem = sentinel();
+        if (!elem || loading || (total !== null && offset >= total)) {
+            return;
+        }
+
+        var data = query();
+        data.offset = offset;
+        data.limit = parseInt(elem.dataset.pageSize);
+
+        var requestGeneration = generation;
+        loading = true;
+        requestGet("./sd_extra_networks/cards", data, function(res) {
+            if (requestGeneration != generation) {
+                return;
+            }
+            loading = false;
+
+            var tmp = document.createElement('DIV');
+            tmp.innerHTML = res.html.join("");
+            var frag = document.createDocumentFragment();
+            while (tmp.firstElementChild) {
+                frag.appendChild(tmp.firstElementChild);
+            }
+            elem.parentElement.insertBefore(frag, elem);
+
+            offset += res.html.length;
+            total = res.total;
+
+            // keep going while the sentinel is still visible, i.e. the pane is not filled yet
+            if (res.html.length > 0 && offset < total) {
+                observer.unobserve(elem);
+                observer.observe(elem);
+            }
+        }, function() {
+            if (requestGeneration == generation) {
+                loading = false;
+            }
+        });
+    }
+
+    function reload(force) {
+        var elem = sentinel();
+        if (!elem) {
+            return;
+        }
+
+        var key = JSON.stringify(query());
+        if (key == lastQuery && elem == observedSentinel && !force) {
+            return;
+        }
+        lastQuery = key;
+
+        generation += 1;
+        offset = 0;
+        total = null;
+        loading = false;
+
+        // the first page of cards comes with the page's HTML; it is kept if it matches the current query
+        var q = query();
+        var prerendered = elem.dataset.offset !== undefined && q.search === "" && q.sort == elem.dataset.sort && q.sortdir == elem.dataset.sortdir;
+        if (prerendered) {
+            offset = parseInt(elem.dataset.offset);
+        } else {
+            Array.from(elem.parentElement.querySelectorAll(':scope > .card')).forEach(function(card) {
+                card.remove();
+            });
+        }
+        delete elem.dataset.offset;
+
+        if (observer) {
+            observer.disconnect();
+        }
+        // cards scroll inside their own container, so that is what decides whether the sentinel is visible
+        observer = new IntersectionObserver(function(entries) {
+            if (entries.some(function(x) {
+                return x.isIntersecting;
+            })) {
+                loadMore();
+            }
+        }, {root: elem.parentElement, rootMargin: "100% 0px"});
+        observedSentinel = elem;
+        observer.observe(elem);
+
+        loadMore();
+    }
+
+    return {reload: reload};
+}
+
 function extraNetworksMovePromptToTab(tabname, id, showPrompt, showNegativePrompt) {
     if (!gradioApp().querySelector('.toprow-compact-tools')) return; // only applicable for compact prompt layout
 
@@ -447,6 +601,38 @@ function extraNetworksControlTreeViewOnClick(event, tabname, extra_networks_tabn
 
     var pane = gradioApp().getElementById(tabname + "_" + extra_networks_tabname + "_pane");
     pane.classList.toggle("extra-network-dirs-hidden", show);
+
+    extraNetworksLoadTreeView(tabname, extra_networks_tabname);
+}
+
+function extraNetworksLoadTreeView(tabname, extra_networks_tabname) {
+    /**
+     * Requests the tree or directories view of a paginated page from the server when it is shown.
+     *
+     * Paginated pages only include a placeholder for it, so that opening the page does not
+     * require building HTML for every item.
+     *
+     * @param tabname                   The name of the active tab in the sd webui. Ex: txt2img, img2img, etc.
+     * @param extra_networks_tabname    The id of the active extraNetworks tab. Ex: lora, checkpoints, etc.
+     */
+    var pane = gradioApp().getElementById(tabname + "_" + extra_networks_tabname + "_pane");
+    if (!pane || pane.classList.contains("extra-network-dirs-hidden")) {
+        return;
+    }
+
+    var placeholder = pane.querySelector(".extra-network-tree-placeholder");
+    if (!placeholder || placeholder.dataset.loading) {
+        return;
+    }
+
+    placeholder.dataset.loading = "1";
+    requestGet("./sd_extra_networks/tree", {page: placeholder.dataset.page, tabname: tabname}, function(res) {
+        if (placeholder.parentElement) {
+            placeholder.outerHTML = res.html;
+        }
+    }, function() {
+        delete placeholder.dataset.loading;
+    });
 }
 
 function extraNetworksControlRefreshOnClick(event, tabname, extra_networks_tabname) {
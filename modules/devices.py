@@ -114,6 +114,7 @@ errors.run(enable_tf32, "Enabling TF32")
 
 cpu: torch.device = torch.device("cpu")
 fp8: bool = False
+cpu_bf16: bool = False
 device: torch.device = None
 device_interrogate: torch.device = None
 device_gfpgan: torch.device = None
@@ -209,6 +210,9 @@ def autocast(disable=False):
     if fp8 and device==cpu:
         return torch.autocast("cpu", dtype=torch.bfloat16, enabled=True)
 
+    if cpu_bf16:
+        return manual_cast(torch.bfloat16)
+
     if fp8 and dtype_inference == torch.float32:
         return manual_cast(dtype)
 
@@ -25,4 +25,4 @@ class ExtraNetworkHypernet(extra_networks.ExtraNetwork):
         hypernetwork.load_hypernetworks(names, multipliers)
 
     def deactivate(self, p):
-        pass
+        hypernetwork.context_cache.clear()
@@ -8,6 +8,10 @@ class FaceRestoration:
     def restore(self, np_image):
         return np_image
 
+    def restore_batch(self, np_images):
+        """restores faces in several images; restorers that can process faces from all images together override this"""
+        return [self.restore(np_image) for np_image in np_images]
+
 
 def restore_faces(np_image):
     face_restorers = [x for x in shared.face_restorers if x.name() == shared.opts.face_restoration_model or shared.opts.face_restoration_model is None]
@@ -17,3 +21,13 @@ def restore_faces(np_image):
     face_restorer = face_restorers[0]
 
     return face_restorer.restore(np_image)
+
+
+def restore_faces_batch(np_images):
+    face_restorers = [x for x in shared.face_restorers if x.name() == shared.opts.face_restoration_model or shared.opts.face_restoration_model is None]
+    if len(face_restorers) == 0:
+        return np_images
+
+    face_restorer = face_restorers[0]
+
+    return face_restorer.restore_batch(np_images)
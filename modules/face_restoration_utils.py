@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
+from collections import OrderedDict
 from functools import cached_property
 from typing import TYPE_CHECKING, Callable
 
@@ -16,6 +18,11 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+detection_cache = OrderedDict()
+"""{image digest: (det_faces, all_landmarks_5)} for recently processed images, shared by all face restorers"""
+
+detection_cache_size = 64
+
 
 def bgr_image_to_rgb_tensor(img: np.ndarray) -> torch.Tensor:
     """Convert a BGR NumPy image in [0..1] range to a PyTorch RGB float32 tensor."""
@@ -55,59 +62,181 @@ def create_face_helper(device) -> FaceRestoreHelper:
     )
 
 
-def restore_with_face_helper(
-    np_image: np.ndarray,
-    face_helper: FaceRestoreHelper,
+def is_out_of_memory_error(e):
+    return isinstance(e, torch.cuda.OutOfMemoryError) or "out of memory" in str(e).lower()
+
+
+def detection_cache_key(np_image: np.ndarray) -> tuple:
+    return hashlib.blake2b(np.ascontiguousarray(np_image).tobytes(), digest_size=16).hexdigest(), np_image.shape, np_image.dtype.str
+
+
+def remember_detection(key: tuple, detection: tuple) -> None:
+    detection_cache[key] = detection
+    detection_cache.move_to_end(key)
+    while len(detection_cache) > detection_cache_size:
+        detection_cache.popitem(last=False)
+
+
+def reuse_face_detection(np_image: np.ndarray, derived_np_image: np.ndarray) -> None:
+    """
+    Makes detect_faces use faces found in an RGB image for another RGB image of the same size that has faces in the same
+    places, such as its restored version, so that restoring it again does not run detection.
+    """
+    if np_image.shape != derived_np_image.shape:
+        return
+
+    detection = detection_cache.get(detection_cache_key(np_image[:, :, ::-1]))
+    if detection is not None:
+        remember_detection(detection_cache_key(derived_np_image[:, :, ::-1]), detection)
+
+
+def detect_faces(np_image: np.ndarray, face_helper: FaceRestoreHelper) -> dict:
+    """
+    Find faces in a BGR image using face_helper and return the part of its state that is needed to paste restored
+    faces back, so that the helper can be used for other images in the meantime.
+
+    Detected landmarks are kept in detection_cache, so that detection is not repeated for the same image, or for an
+    image produced by restoring faces in it, see reuse_face_detection.
+    """
+    face_helper.clean_all()
+    face_helper.read_image(np_image)
+
+    # same image is often restored several times: by GFPGAN and then CodeFormer, or with different weights in X/Y/Z plot
+    key = detection_cache_key(np_image)
+    cached = detection_cache.get(key)
+    if cached is not None:
+        detection_cache.move_to_end(key)
+        face_helper.det_faces, face_helper.all_landmarks_5 = list(cached[0]), list(cached[1])
+    else:
+        face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
+        remember_detection(key, (list(face_helper.det_faces), list(face_helper.all_landmarks_5)))
+
+    face_helper.align_warp_face()
+
+    return {
+        "input_img": face_helper.input_img,
+        "affine_matrices": list(face_helper.affine_matrices),
+        "cropped_faces": list(face_helper.cropped_faces),
+    }
+
+
+def restore_cropped_faces(
+    cropped_faces: list[np.ndarray],
     restore_face: Callable[[torch.Tensor], torch.Tensor],
-) -> np.ndarray:
+) -> list[np.ndarray]:
     """
-    Find faces in the image using face_helper, restore them using restore_face, and paste them back into the image.
+    Restore cropped BGR faces using restore_face, several faces at a time.
 
-    `restore_face` should take a cropped face image and return a restored face image.
+    The number of faces given to restore_face at once is limited by the face_restoration_batch_size setting, and is
+    halved if that runs out of memory. If restoring fails otherwise, the faces are left as they were.
     """
     from torchvision.transforms.functional import normalize
-    np_image = np_image[:, :, ::-1]
-    original_resolution = np_image.shape[0:2]
 
-    try:
-        logger.debug("Detecting faces...")
-        face_helper.clean_all()
-        face_helper.read_image(np_image)
-        face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
-        face_helper.align_warp_face()
-        logger.debug("Found %d faces, restoring", len(face_helper.cropped_faces))
-        for cropped_face in face_helper.cropped_faces:
-            cropped_face_t = bgr_image_to_rgb_tensor(cropped_face / 255.0)
-            normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
-            cropped_face_t = cropped_face_t.unsqueeze(0).to(devices.device_codeformer)
-
-            try:
-                with torch.no_grad():
-                    cropped_face_t = restore_face(cropped_face_t)
+    res = []
+    batch_size = max(1, shared.opts.face_restoration_batch_size)
+    i = 0
+
+    while i < len(cropped_faces):
+        batch = cropped_faces[i:i + batch_size]
+        batch_t = torch.stack([bgr_image_to_rgb_tensor(cropped_face / 255.0) for cropped_face in batch])
+        normalize(batch_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+        batch_t = batch_t.to(devices.device_codeformer)
+
+        try:
+            with torch.no_grad():
+                batch_t = restore_face(batch_t)
+        except Exception as e:
+            if len(batch) > 1 and is_out_of_memory_error(e):
+                batch_size = len(batch) // 2
+                logger.debug("Out of memory restoring %d faces, trying %d", len(batch), batch_size)
                 devices.torch_gc()
-            except Exception:
-                errors.report('Failed face-restoration inference', exc_info=True)
-
-            restored_face = rgb_tensor_to_bgr_image(cropped_face_t, min_max=(-1, 1))
-            restored_face = (restored_face * 255.0).astype('uint8')
-            face_helper.add_restored_face(restored_face)
-
-        logger.debug("Merging restored faces into image")
-        face_helper.get_inverse_affine(None)
-        img = face_helper.paste_faces_to_input_image()
-        img = img[:, :, ::-1]
-        if original_resolution != img.shape[0:2]:
-            img = cv2.resize(
-                img,
-                (0, 0),
-                fx=original_resolution[1] / img.shape[1],
-                fy=original_resolution[0] / img.shape[0],
-                interpolation=cv2.INTER_LINEAR,
-            )
+                continue
+
+            errors.report('Failed face-restoration inference', exc_info=True)
+
+        for restored_face_t in batch_t:
+            restored_face = rgb_tensor_to_bgr_image(restored_face_t, min_max=(-1, 1))
+            res.append((restored_face * 255.0).astype('uint8'))
+
+        i += len(batch)
+
+    return res
+
+
+def paste_faces(face_helper: FaceRestoreHelper, detected: dict, restored_faces: list[np.ndarray]) -> np.ndarray:
+    """Paste restored faces back into the image that detect_faces returned `detected` for; returns a BGR image."""
+    face_helper.clean_all()
+    face_helper.input_img = detected["input_img"]
+    face_helper.affine_matrices = detected["affine_matrices"]
+    for restored_face in restored_faces:
+        face_helper.add_restored_face(restored_face)
+
+    face_helper.get_inverse_affine(None)
+    return face_helper.paste_faces_to_input_image()
+
+
+def restore_batch_with_face_helper(
+    np_images: list[np.ndarray],
+    face_helper: FaceRestoreHelper,
+    restore_face: Callable[[torch.Tensor], torch.Tensor],
+) -> list[np.ndarray]:
+    """
+    Find faces in the images using face_helper, restore them using restore_face, and paste them back into the images.
+
+    Faces from all images are restored together, so `restore_face` should take a batch of cropped face images and
+    return a batch of restored face images.
+    """
+    try:
+        detected = []
+        for np_image in np_images:
+            logger.debug("Detecting faces...")
+            detected.append(detect_faces(np_image[:, :, ::-1], face_helper))
+
+        cropped_faces = [face for item in detected for face in item["cropped_faces"]]
+        logger.debug("Found %d faces in %d images, restoring", len(cropped_faces), len(np_images))
+        restored_faces = restore_cropped_faces(cropped_faces, restore_face)
+        devices.torch_gc()
+
+        logger.debug("Merging restored faces into images")
+        res = []
+        for np_image, item in zip(np_images, detected):
+            face_count = len(item["cropped_faces"])
+            img = paste_faces(face_helper, item, restored_faces[:face_count])
+            restored_faces = restored_faces[face_count:]
+
+            img = img[:, :, ::-1]
+            original_resolution = np_image.shape[0:2]
+            if original_resolution != img.shape[0:2]:
+                img = cv2.resize(
+                    img,
+                    (0, 0),
+                    fx=original_resolution[1] / img.shape[1],
+                    fy=original_resolution[0] / img.shape[0],
+                    interpolation=cv2.INTER_LINEAR,
+                )
+
+            # faces do not move when restored, so a restorer running on this output next can skip detection
+            reuse_face_detection(np_image, img)
+            res.append(img)
+
         logger.debug("Face restoration complete")
     finally:
         face_helper.clean_all()
-    return img
+
+    return res
+
+
+def restore_with_face_helper(
+    np_image: np.ndarray,
+    face_helper: FaceRestoreHelper,
+    restore_face: Callable[[torch.Tensor], torch.Tensor],
+) -> np.ndarray:
+    """
+    Find faces in the image using face_helper, restore them using restore_face, and paste them back into the image.
+
+    `restore_face` should take a batch of cropped face images and return a batch of restored face images.
+    """
+    return restore_batch_with_face_helper([np_image], face_helper, restore_face)[0]
 
 
 class CommonFaceRestoration(face_restoration.FaceRestoration):
@@ -145,16 +274,23 @@ class CommonFaceRestoration(face_restoration.FaceRestoration):
         np_image: np.ndarray,
         restore_face: Callable[[torch.Tensor], torch.Tensor],
     ) -> np.ndarray:
+        return self.restore_batch_with_helper([np_image], restore_face)[0]
+
+    def restore_batch_with_helper(
+        self,
+        np_images: list[np.ndarray],
+        restore_face: Callable[[torch.Tensor], torch.Tensor],
+    ) -> list[np.ndarray]:
         try:
             if self.net is None:
                 self.net = self.load_net()
         except Exception:
             logger.warning("Unable to load face-restoration model", exc_info=True)
-            return np_image
+            return np_images
 
         try:
             self.send_model_to(self.get_device())
-            return restore_with_face_helper(np_image, self.face_helper, restore_face)
+            return restore_batch_with_face_helper(np_images, self.face_helper, restore_face)
         finally:
             if shared.opts.face_restoration_unload:
                 self.send_model_to(devices.cpu)
@@ -149,6 +149,7 @@ class Hypernetwork:
         self.filename = None
         self.name = name
         self.layers = {}
+        self.multiplier = 1.0
         self.step = 0
         self.sd_checkpoint = None
         self.sd_checkpoint_name = None
@@ -197,6 +198,8 @@ class Hypernetwork:
         return self
 
     def set_multiplier(self, multiplier):
+        self.multiplier = multiplier
+
         for layers in self.layers.values():
             for layer in layers:
                 layer.multiplier = multiplier
@@ -335,6 +338,8 @@ def load_hypernetwork(name):
 
 
 def load_hypernetworks(names, multipliers=None):
+    context_cache.clear()
+
     already_loaded = {}
 
     for hypernetwork in shared.loaded_hypernetworks:
@@ -370,7 +375,80 @@ def apply_single_hypernetwork(hypernetwork, context_k, context_v, layer=None):
     return context_k, context_v
 
 
+class HypernetworkContextCache:
+    """Keeps hypernetwork-transformed k/v contexts for recently seen conditionings.
+
+    All cross-attention layers with the same context size use the same hypernetwork layers, and
+    the conditioning does not change between sampling steps, so most of the time the result of
+    running the hypernetworks on a context has already been computed for another layer or step.
+    """
+
+    max_entries = 8
+
+    def __init__(self):
+        self.entries = {}
+
+    def clear(self):
+        self.entries.clear()
+
+    def find(self, hypernetworks_key, context):
+        for entry in self.entries.get((hypernetworks_key, context.shape[2]), []):
+            cached_context, context_k, context_v = entry
+            if cached_context.shape == context.shape and cached_context.dtype == context.dtype and cached_context.device == context.device and torch.equal(cached_context, context):
+                return context_k, context_v
+
+        return None
+
+    def store(self, hypernetworks_key, context, context_k, context_v):
+        entries = self.entries.setdefault((hypernetworks_key, context.shape[2]), [])
+        entries.insert(0, (context, context_k, context_v))
+        del entries[self.max_entries:]
+
+
+context_cache = HypernetworkContextCache()
+
+
+def apply_hypernetworks_fused(hypernetworks, context, layer=None):
+    """Runs the whole stack of hypernetworks on context in one pass, converting dtypes only once at the start and at the end."""
+
+    context_k = context_v = devices.cond_cast_float(context)
+    for hypernetwork in hypernetworks:
+        hypernetwork_layers = hypernetwork.layers.get(context.shape[2], None)
+        if hypernetwork_layers is None:
+            continue
+
+        if layer is not None:
+            layer.hyper_k = hypernetwork_layers[0]
+            layer.hyper_v = hypernetwork_layers[1]
+
+        context_k = hypernetwork_layers[0](context_k)
+        context_v = hypernetwork_layers[1](context_v)
+
+    if context_k is context_v:
+        return context, context
+
+    return devices.cond_cast_unet(context_k), devices.cond_cast_unet(context_v)
+
+
 def apply_hypernetworks(hypernetworks, context, layer=None):
+    if hypernetworks and shared.opts.hypernetwork_cache_context and not torch.is_grad_enabled():
+        hypernetworks_key = tuple((id(x), x.multiplier) for x in hypernetworks)
+
+        cached = context_cache.find(hypernetworks_key, context)
+        if cached is not None:
+            if layer is not None:
+                for hypernetwork in hypernetworks:
+                    hypernetwork_layers = hypernetwork.layers.get(context.shape[2], None)
+                    if hypernetwork_layers is not None:
+                        layer.hyper_k = hypernetwork_layers[0]
+                        layer.hyper_v = hypernetwork_layers[1]
+
+            return cached
+
+        context_k, context_v = apply_hypernetworks_fused(hypernetworks, context, layer)
+        context_cache.store(hypernetworks_key, context, context_k, context_v)
+        return context_k, context_v
+
     context_k = context
     context_v = context
     for hypernetwork in hypernetworks:
@@ -166,8 +166,10 @@ def initialize_rest(*, reload_script_modules=False):
     sd_hijack.list_optimizers()
     startup_timer.record("scripts list_optimizers")
 
-    from modules import sd_unet
+    from modules import sd_unet, sd_unet_compile, sd_unet_deepcache
 
+    script_callbacks.on_list_unets(sd_unet_deepcache.list_unets)
+    script_callbacks.on_list_unets(sd_unet_compile.list_unets)
     sd_unet.list_unets()
     startup_timer.record("scripts list_unets")
 
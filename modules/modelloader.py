@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import importlib
+import itertools
 import logging
 import os
+import threading
+from collections import OrderedDict
 from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
@@ -138,7 +141,7 @@ def load_upscalers():
     )
 
 
-def load_spandrel_model(
+def load_spandrel_model_uncached(
     path: str | os.PathLike,
     *,
     device: str | torch.device | None,
@@ -167,3 +170,53 @@ def load_spandrel_model(
         model_descriptor, path, device, half, dtype,
     )
     return model_descriptor
+
+
+spandrel_models_cache = OrderedDict()
+"""{(path, mtime, device, prefer_half, dtype, expected_architecture): (model descriptor, size in bytes)}, least recently used first"""
+
+spandrel_models_cache_lock = threading.Lock()
+
+
+def model_size_in_bytes(model: torch.nn.Module) -> int:
+    return sum(t.numel() * t.element_size() for t in itertools.chain(model.parameters(), model.buffers()))
+
+
+def load_spandrel_model(
+    path: str | os.PathLike,
+    *,
+    device: str | torch.device | None,
+    prefer_half: bool = False,
+    dtype: str | torch.dtype | None = None,
+    expected_architecture: str | None = None,
+) -> spandrel.ModelDescriptor:
+    """
+    Loads a model with spandrel, or returns the same model loaded with same arguments before.
+
+    Loaded models are kept in memory until their total size exceeds the limit from settings, after which the least
+    recently used ones are unloaded.
+    """
+
+    path = os.path.abspath(path)
+    key = (path, os.path.getmtime(path), str(device), prefer_half, str(dtype), expected_architecture)
+
+    with spandrel_models_cache_lock:
+        cached = spandrel_models_cache.get(key)
+        if cached is not None:
+            spandrel_models_cache.move_to_end(key)
+            return cached[0]
+
+    model_descriptor = load_spandrel_model_uncached(path, device=device, prefer_half=prefer_half, dtype=dtype, expected_architecture=expected_architecture)
+
+    limit = int(shared.opts.upscaler_models_cache_size * 1024 * 1024)
+    model_size = model_size_in_bytes(model_descriptor.model)
+    if model_size > limit:
+        return model_descriptor
+
+    with spandrel_models_cache_lock:
+        spandrel_models_cache[key] = (model_descriptor, model_size)
+
+        while sum(size for _, size in spandrel_models_cache.values()) > limit:
+            spandrel_models_cache.popitem(last=False)
+
+    return model_descriptor
@@ -1,4 +1,6 @@
+import collections
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
@@ -6,6 +8,150 @@ from modules import shared, images, devices, scripts, scripts_postprocessing, ui
 from modules.shared import opts
 
 
+def read_image_data(image_placeholder):
+    """returns (image, existing pnginfo) for an image or a filename, or None if the file can't be read; in batch mode, this runs on prefetch threads"""
+
+    if isinstance(image_placeholder, str):
+        try:
+            image_data = images.read(image_placeholder)
+        except Exception:
+            return None
+    else:
+        image_data = image_placeholder
+
+    parameters, existing_pnginfo = images.read_info_from_image(image_data)
+    if parameters:
+        existing_pnginfo["parameters"] = parameters
+
+    if image_data.mode not in ("RGBA", "RGB"):
+        image_data = image_data.convert("RGB")
+
+    return image_data, existing_pnginfo
+
+
+def prefetch(items, fn, count):
+    """yields (item, fn(item[0])) for items, computing fn for up to count items ahead on separate threads"""
+
+    if count <= 0 or len(items) <= 1:
+        for item in items:
+            yield item, fn(item[0])
+        return
+
+    items = iter(items)
+    pending = collections.deque()
+
+    with ThreadPoolExecutor(max_workers=min(count, os.cpu_count() or 1), thread_name_prefix="postprocessing_read") as executor:
+        try:
+            for item in items:
+                pending.append((item, executor.submit(fn, item[0])))
+                if len(pending) >= count:
+                    break
+
+            while pending:
+                item, future = pending.popleft()
+
+                next_item = next(items, None)
+                if next_item is not None:
+                    pending.append((next_item, executor.submit(fn, next_item[0])))
+
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+finished_inputs_filename = ".extras-batch-finished"
+"""file in the output directory listing input images that have been fully processed, one absolute path per line"""
+
+
+def read_finished_inputs(outpath):
+    """returns absolute paths of input images recorded as finished by mark_input_finished in outpath"""
+
+    try:
+        with open(os.path.join(outpath, finished_inputs_filename), encoding="utf8") as file:
+            return {line.rstrip("\n") for line in file if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def mark_input_finished(outpath, name):
+    os.makedirs(outpath, exist_ok=True)
+
+    with open(os.path.join(outpath, finished_inputs_filename), "a", encoding="utf8") as file:
+        file.write(os.path.abspath(name) + "\n")
+
+
+def skip_finished_inputs(data_to_process, outpath):
+    """removes (image, filename) entries of input images recorded as finished in outpath from data_to_process"""
+
+    finished = read_finished_inputs(outpath)
+    remaining = [x for x in data_to_process if os.path.abspath(x[1]) not in finished]
+    if len(remaining) != len(data_to_process):
+        print(f"Extras batch: skipping {len(data_to_process) - len(remaining)} images that were already processed into {outpath}")
+
+    return remaining
+
+
+def save_postprocessed_image(image, caption, outpath, basename, infotext, existing_pnginfo, forced_filename, suffix):
+    fullfn, _ = images.save_image(image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=existing_pnginfo, forced_filename=forced_filename, suffix=suffix)
+
+    if caption:
+        caption_filename = os.path.splitext(fullfn)[0] + ".txt"
+        existing_caption = ""
+        try:
+            with open(caption_filename, encoding="utf8") as file:
+                existing_caption = file.read().strip()
+        except FileNotFoundError:
+            pass
+
+        action = shared.opts.postprocessing_existing_caption_action
+        if action == 'Prepend' and existing_caption:
+            caption = f"{existing_caption} {caption}"
+        elif action == 'Append' and existing_caption:
+            caption = f"{caption} {existing_caption}"
+        elif action == 'Keep' and existing_caption:
+            caption = existing_caption
+
+        caption = caption.strip()
+        if caption:
+            with open(caption_filename, "w", encoding="utf8") as file:
+                file.write(caption)
+
+
+class BackgroundSaver:
+    """
+    Saves images on a separate thread, so that the next image can be processed while the previous one is encoded
+    and written to disk. At most max_pending images wait to be saved; submitting more waits for the oldest one.
+    """
+
+    def __init__(self, enabled, max_pending=4):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="postprocessing_save") if enabled else None
+        self.max_pending = max_pending
+        self.futures = collections.deque()
+
+    def submit(self, fn, *args):
+        if self.executor is None:
+            fn(*args)
+            return
+
+        while len(self.futures) >= self.max_pending:
+            self.futures.popleft().result()
+
+        self.futures.append(self.executor.submit(fn, *args))
+
+    def wait(self):
+        """waits for all submitted images to be saved, raising the first error that happened while saving"""
+
+        if self.executor is None:
+            return
+
+        try:
+            while self.futures:
+                self.futures.popleft().result()
+        finally:
+            self.executor.shutdown()
+
+
 def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir, show_extras_results, *args, save_output: bool = True):
     devices.torch_gc()
 
@@ -42,85 +188,72 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
     infotext = ''
 
     data_to_process = list(get_images(extras_mode, image, image_folder, input_dir))
+
+    # inputs are recorded as finished after all their outputs are saved, so that an interrupted batch can be resumed
+    record_finished = extras_mode == 2 and save_output and opts.postprocessing_batch_skip_existing
+    if record_finished:
+        data_to_process = skip_finished_inputs(data_to_process, outpath)
+
     shared.state.job_count = len(data_to_process)
 
-    for image_placeholder, name in data_to_process:
-        image_data: Image.Image
+    # reading from directory happens ahead on separate threads; postprocessing scripts run on this thread one image at a time
+    prefetch_count = opts.postprocessing_batch_prefetch if extras_mode == 2 else 0
+    saver = BackgroundSaver(extras_mode == 2 and save_output and opts.postprocessing_batch_save_in_background, max_pending=max(prefetch_count, 1))
 
-        shared.state.nextjob()
-        shared.state.textinfo = name
-        shared.state.skipped = False
+    try:
+        for (image_placeholder, name), image_data in prefetch(data_to_process, read_image_data, prefetch_count):
+            shared.state.nextjob()
+            shared.state.textinfo = name
+            shared.state.skipped = False
 
-        if shared.state.interrupted:
-            break
+            if shared.state.interrupted:
+                break
 
-        if isinstance(image_placeholder, str):
-            try:
-                image_data = images.read(image_placeholder)
-            except Exception:
+            if image_data is None:
                 continue
-        else:
-            image_data = image_placeholder
-
-        parameters, existing_pnginfo = images.read_info_from_image(image_data)
-        if parameters:
-            existing_pnginfo["parameters"] = parameters
-
-        initial_pp = scripts_postprocessing.PostprocessedImage(image_data if image_data.mode in ("RGBA", "RGB") else image_data.convert("RGB"))
-
-        scripts.scripts_postproc.run(initial_pp, args)
-
-        if shared.state.skipped:
-            continue
-
-        used_suffixes = {}
-        for pp in [initial_pp, *initial_pp.extra_images]:
-            suffix = pp.get_suffix(used_suffixes)
-
-            if opts.use_original_name_batch and name is not None:
-                basename = os.path.splitext(os.path.basename(name))[0]
-                forced_filename = basename + suffix
-            else:
-                basename = ''
-                forced_filename = None
-
-            infotext = ", ".join([k if k == v else f'{k}: {infotext_utils.quote(v)}' for k, v in pp.info.items() if v is not None])
-
-            if opts.enable_pnginfo:
-                pp.image.info = existing_pnginfo
-                pp.image.info["postprocessing"] = infotext
-
-            shared.state.assign_current_image(pp.image)
-
-            if save_output:
-                fullfn, _ = images.save_image(pp.image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=existing_pnginfo, forced_filename=forced_filename, suffix=suffix)
-
-                if pp.caption:
-                    caption_filename = os.path.splitext(fullfn)[0] + ".txt"
-                    existing_caption = ""
-                    try:
-                        with open(caption_filename, encoding="utf8") as file:
-                            existing_caption = file.read().strip()
-                    except FileNotFoundError:
-                        pass
-
-                    action = shared.opts.postprocessing_existing_caption_action
-                    if action == 'Prepend' and existing_caption:
-                        caption = f"{existing_caption} {pp.caption}"
-                    elif action == 'Append' and existing_caption:
-                        caption = f"{pp.caption} {existing_caption}"
-                    elif action == 'Keep' and existing_caption:
-                        caption = existing_caption
-                    else:
-                        caption = pp.caption
-
-                    caption = caption.strip()
-                    if caption:
-                        with open(caption_filename, "w", encoding="utf8") as file:
-                            file.write(caption)
-
-            if extras_mode != 2 or show_extras_results:
-                outputs.append(pp.image)
+
+            image_data, existing_pnginfo = image_data
+
+            initial_pp = scripts_postprocessing.PostprocessedImage(image_data)
+
+            scripts.scripts_postproc.run(initial_pp, args)
+
+            if shared.state.skipped:
+                continue
+
+            used_suffixes = {}
+            for pp in [initial_pp, *initial_pp.extra_images]:
+                suffix = pp.get_suffix(used_suffixes)
+
+                if opts.use_original_name_batch and name is not None:
+                    basename = os.path.splitext(os.path.basename(name))[0]
+                    forced_filename = basename + suffix
+                else:
+                    basename = ''
+                    forced_filename = None
+
+                infotext = ", ".join([k if k == v else f'{k}: {infotext_utils.quote(v)}' for k, v in pp.info.items() if v is not None])
+
+                # every image gets its own copy, since saving in background modifies it while the next image is prepared
+                pnginfo = dict(existing_pnginfo)
+
+                if opts.enable_pnginfo:
+                    pp.image.info = pnginfo
+                    pp.image.info["postprocessing"] = infotext
+
+                shared.state.assign_current_image(pp.image)
+
+                if save_output:
+                    saver.submit(save_postprocessed_image, pp.image, pp.caption, outpath, basename, infotext, pnginfo, forced_filename, suffix)
+
+                if extras_mode != 2 or show_extras_results:
+                    outputs.append(pp.image)
+
+            if record_finished:
+                # the saver runs tasks in order, so this happens after the images above are written
+                saver.submit(mark_input_finished, outpath, name)
+    finally:
+        saver.wait()
 
     devices.torch_gc()
     shared.state.end()
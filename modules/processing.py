@@ -5,6 +5,8 @@ import math
 import os
 import sys
 import hashlib
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 
 import torch
@@ -211,6 +213,9 @@ class StableDiffusionProcessing:
     denoising_strength: float = None
     ddim_discretize: str = None
     s_min_uncond: float = None
+    cfg_truncation_step: float = None
+    cfg_truncation_sigma: float = None
+    cfg_truncation_tolerance: float = None
     s_churn: float = None
     s_tmax: float = None
     s_tmin: float = None
@@ -285,6 +290,15 @@ class StableDiffusionProcessing:
         self.s_min_uncond = (
             self.s_min_uncond if self.s_min_uncond is not None else opts.s_min_uncond
         )
+        self.cfg_truncation_step = (
+            self.cfg_truncation_step if self.cfg_truncation_step is not None else opts.cfg_truncation_step
+        )
+        self.cfg_truncation_sigma = (
+            self.cfg_truncation_sigma if self.cfg_truncation_sigma is not None else opts.cfg_truncation_sigma
+        )
+        self.cfg_truncation_tolerance = (
+            self.cfg_truncation_tolerance if self.cfg_truncation_tolerance is not None else opts.cfg_truncation_tolerance
+        )
         self.s_churn = self.s_churn if self.s_churn is not None else opts.s_churn
         self.s_tmin = self.s_tmin if self.s_tmin is not None else opts.s_tmin
         self.s_tmax = (
@@ -495,6 +509,11 @@ class StableDiffusionProcessing:
     def init(self, all_prompts, all_seeds, all_subseeds):
         pass
 
+    def setup_batch(self, n):
+        """Called at the start of every iteration of process_images, after prompts and seeds for the batch are chosen
+        and before scripts' batch callbacks run."""
+        pass
+
     def sample(
         self,
         conditioning,
@@ -857,49 +876,113 @@ class DecodedSamples(list):
     already_decoded = True
 
 
+def estimate_vae_decode_memory(latent_shape, dtype):
+    """Returns a rough estimate of how many bytes of memory decoding one latent of given (channels, height, width) shape takes."""
+
+    height, width = latent_shape[-2], latent_shape[-1]
+    element_size = torch.tensor([], dtype=dtype).element_size()
+
+    # a few 256-channel activations at full resolution in the last upsampling block, plus attention in the middle block
+    upsampling = height * 8 * width * 8 * 256 * 3
+    attention = (height * width) ** 2
+
+    return (upsampling + attention) * element_size
+
+
+def vae_decode_batch_size(batch):
+    max_size = min(batch.shape[0], shared.opts.sd_vae_decode_batch_size)
+    if max_size <= 1:
+        return 1
+
+    from modules import sd_hijack_optimizations
+
+    available = sd_hijack_optimizations.get_available_vram() * 0.8
+    return max(1, min(max_size, int(available // estimate_vae_decode_memory(batch.shape[1:], devices.dtype_vae))))
+
+
+def is_out_of_memory_error(e):
+    return isinstance(e, torch.cuda.OutOfMemoryError) or "out of memory" in str(e).lower()
+
+
+def fix_vae_nans(model, chunk, decoded):
+    """If any of decoded images is all NaNs, converts VAE to a type set in settings and decodes the chunk again."""
+
+    try:
+        for sample in decoded:
+            devices.test_for_nans(sample, "vae")
+    except devices.NansException as e:
+        if shared.opts.auto_vae_precision_bfloat16:
+            autofix_dtype = torch.bfloat16
+            autofix_dtype_text = "bfloat16"
+            autofix_dtype_setting = "Automatically convert VAE to bfloat16"
+            autofix_dtype_comment = ""
+        elif shared.opts.auto_vae_precision:
+            autofix_dtype = torch.float32
+            autofix_dtype_text = "32-bit float"
+            autofix_dtype_setting = "Automatically revert VAE to 32-bit floats"
+            autofix_dtype_comment = "\nTo always start with 32-bit VAE, use --no-half-vae commandline flag."
+        else:
+            raise e
+
+        if devices.dtype_vae == autofix_dtype:
+            raise e
+
+        errors.print_error_explanation(
+            "A tensor with all NaNs was produced in VAE.\n"
+            f"Web UI will now convert VAE into {autofix_dtype_text} and retry.\n"
+            f"To disable this behavior, disable the '{autofix_dtype_setting}' setting.{autofix_dtype_comment}"
+        )
+
+        devices.dtype_vae = autofix_dtype
+        model.first_stage_model.to(devices.dtype_vae)
+
+        return decode_first_stage(model, chunk.to(devices.dtype_vae))
+
+    return decoded
+
+
 def decode_latent_batch(model, batch, target_device=None, check_for_nans=False):
-    samples = DecodedSamples()
+    """Decodes latents with VAE in chunks that fit into memory; returns a list of decoded images."""
 
-    for i in range(batch.shape[0]):
-        sample = decode_first_stage(model, batch[i : i + 1])[0]
-
-        if check_for_nans:
-
-            try:
-                devices.test_for_nans(sample, "vae")
-            except devices.NansException as e:
-                if shared.opts.auto_vae_precision_bfloat16:
-                    autofix_dtype = torch.bfloat16
-                    autofix_dtype_text = "bfloat16"
-                    autofix_dtype_setting = "Automatically convert VAE to bfloat16"
-                    autofix_dtype_comment = ""
-                elif shared.opts.auto_vae_precision:
-                    autofix_dtype = torch.float32
-                    autofix_dtype_text = "32-bit float"
-                    autofix_dtype_setting = "Automatically revert VAE to 32-bit floats"
-                    autofix_dtype_comment = "\nTo always start with 32-bit VAE, use --no-half-vae commandline flag."
-                else:
-                    raise e
+    shared.state.live_preview_worker.wait()
+
+    samples = DecodedSamples()
+    pending_copies = False
 
-                if devices.dtype_vae == autofix_dtype:
-                    raise e
+    chunk_size = vae_decode_batch_size(batch)
+    i = 0
+    while i < batch.shape[0]:
+        chunk = batch[i : i + chunk_size]
 
-                errors.print_error_explanation(
-                    "A tensor with all NaNs was produced in VAE.\n"
-                    f"Web UI will now convert VAE into {autofix_dtype_text} and retry.\n"
-                    f"To disable this behavior, disable the '{autofix_dtype_setting}' setting.{autofix_dtype_comment}"
-                )
+        try:
+            decoded = decode_first_stage(model, chunk)
 
-                devices.dtype_vae = autofix_dtype
-                model.first_stage_model.to(devices.dtype_vae)
-                batch = batch.to(devices.dtype_vae)
+            if check_for_nans:
+                decoded = fix_vae_nans(model, chunk, decoded)
+        except Exception as e:
+            if len(chunk) <= 1 or not is_out_of_memory_error(e):
+                raise
 
-                sample = decode_first_stage(model, batch[i : i + 1])[0]
+            chunk_size = len(chunk) // 2
+            print(f"Out of memory when decoding {len(chunk)} images with VAE; retrying with {chunk_size}")
+            devices.torch_gc()
+            continue
+
+        if target_device is not None and target_device.type == "cpu" and decoded.device.type == "cuda":
+            # copy to pinned memory does not block, so the next chunk can start decoding while the result is copied
+            result = torch.empty(decoded.shape, dtype=decoded.dtype, device=target_device, pin_memory=True)
+            result.copy_(decoded, non_blocking=True)
+            pending_copies = True
+        elif target_device is not None:
+            result = decoded.to(target_device)
+        else:
+            result = decoded
 
-        if target_device is not None:
-            sample = sample.to(target_device)
+        samples.extend(result)
+        i += len(chunk)
 
-        samples.append(sample)
+    if pending_copies:
+        torch.cuda.synchronize()
 
     return samples
 
@@ -1059,6 +1142,9 @@ def create_infotext(
         "Init image hash": getattr(p, "init_img_hash", None),
         "RNG": opts.randn_source if opts.randn_source != "GPU" else None,
         "NGMS": None if p.s_min_uncond == 0 else p.s_min_uncond,
+        "CFG truncation step": None if not p.cfg_truncation_step else p.cfg_truncation_step,
+        "CFG truncation sigma": None if not p.cfg_truncation_sigma else p.cfg_truncation_sigma,
+        "CFG truncation tolerance": None if not p.cfg_truncation_tolerance else p.cfg_truncation_tolerance,
         "Tiling": "True" if p.tiling else None,
         **p.extra_generation_params,
         "Version": program_version() if opts.add_version_to_infotext else None,
@@ -1141,6 +1227,38 @@ def process_images(p: StableDiffusionProcessing) -> Processed:
     return res
 
 
+class BackgroundImageSaver:
+    """
+    Saves images on a separate thread in the order they were submitted, so that the next batch can start sampling
+    while images of the previous one are being encoded and written to disk.
+
+    Each save gets a shallow copy of p, so that it sees p's batch-specific fields as they were when it was submitted.
+    """
+
+    def __init__(self, enabled):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save_images") if enabled else None
+        self.futures = []
+
+    def save_image(self, image, *args, p=None, **kwargs):
+        if self.executor is None:
+            return images.save_image(image, *args, p=p, **kwargs)
+
+        self.futures.append(self.executor.submit(images.save_image, image, *args, p=copy.copy(p), **kwargs))
+
+    def wait(self):
+        """waits for all submitted images to be saved, raising the first error that happened while saving"""
+
+        if self.executor is None:
+            return
+
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.futures.clear()
+            self.executor.shutdown()
+
+
 def process_images_inner(p: StableDiffusionProcessing) -> Processed:
     """this is the main loop that both txt2img and img2img use; it calls func_init once inside all the scopes and func_sample once per batch"""
 
@@ -1212,286 +1330,227 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                 sd_vae_approx.model()
 
             sd_unet.apply_unet()
+            if sd_unet.current_unet is not None:
+                sd_unet.current_unet.add_infotext(p)
 
         if state.job_count == -1:
             state.job_count = p.n_iter
 
-        for n in range(p.n_iter):
-            p.iteration = n
+        image_saver = BackgroundImageSaver(opts.save_images_in_background)
 
-            if state.skipped:
-                state.skipped = False
+        try:
+            for n in range(p.n_iter):
+                p.iteration = n
 
-            if state.interrupted or state.stopping_generation:
-                break
+                if state.skipped:
+                    state.skipped = False
 
-            sd_models.reload_model_weights()  # model can be changed for example by refiner
+                if state.interrupted or state.stopping_generation:
+                    break
 
-            p.prompts = p.all_prompts[n * p.batch_size : (n + 1) * p.batch_size]
-            p.negative_prompts = p.all_negative_prompts[
-                n * p.batch_size : (n + 1) * p.batch_size
-            ]
-            p.seeds = p.all_seeds[n * p.batch_size : (n + 1) * p.batch_size]
-            p.subseeds = p.all_subseeds[n * p.batch_size : (n + 1) * p.batch_size]
-
-            p.rng = rng.ImageRNG(
-                (opt_C, p.height // opt_f, p.width // opt_f),
-                p.seeds,
-                subseeds=p.subseeds,
-                subseed_strength=p.subseed_strength,
-                seed_resize_from_h=p.seed_resize_from_h,
-                seed_resize_from_w=p.seed_resize_from_w,
-            )
+                sd_models.reload_model_weights()  # model can be changed for example by refiner
+
+                p.prompts = p.all_prompts[n * p.batch_size : (n + 1) * p.batch_size]
+                p.negative_prompts = p.all_negative_prompts[
+                    n * p.batch_size : (n + 1) * p.batch_size
+                ]
+                p.seeds = p.all_seeds[n * p.batch_size : (n + 1) * p.batch_size]
+                p.subseeds = p.all_subseeds[n * p.batch_size : (n + 1) * p.batch_size]
 
-            if p.scripts is not None:
-                p.scripts.before_process_batch(
-                    p,
-                    batch_number=n,
-                    prompts=p.prompts,
-                    seeds=p.seeds,
+                p.rng = rng.ImageRNG(
+                    (opt_C, p.height // opt_f, p.width // opt_f),
+                    p.seeds,
                     subseeds=p.subseeds,
+                    subseed_strength=p.subseed_strength,
+                    seed_resize_from_h=p.seed_resize_from_h,
+                    seed_resize_from_w=p.seed_resize_from_w,
                 )
 
-            if len(p.prompts) == 0:
-                break
+                p.setup_batch(n)
 
-            p.parse_extra_network_prompts()
-
-            if not p.disable_extra_networks:
-                with devices.autocast():
-                    extra_networks.activate(p, p.extra_network_data)
-
-            if p.scripts is not None:
-                p.scripts.process_batch(
-                    p,
-                    batch_number=n,
-                    prompts=p.prompts,
-                    seeds=p.seeds,
-                    subseeds=p.subseeds,
-                )
+                if p.scripts is not None:
+                    p.scripts.before_process_batch(
+                        p,
+                        batch_number=n,
+                        prompts=p.prompts,
+                        seeds=p.seeds,
+                        subseeds=p.subseeds,
+                    )
 
-            p.setup_conds()
+                if len(p.prompts) == 0:
+                    break
 
-            p.extra_generation_params.update(model_hijack.extra_generation_params)
+                p.parse_extra_network_prompts()
 
-            # params.txt should be saved after scripts.process_batch, since the
-            # infotext could be modified by that callback
-            # Example: a wildcard processed by process_batch sets an extra model
-            # strength, which is saved as "Model Strength: 1.0" in the infotext
-            if n == 0 and not cmd_opts.no_prompt_history:
-                with open(
-                    os.path.join(paths.data_path, "params.txt"), "w", encoding="utf8"
-                ) as file:
-                    processed = Processed(p, [])
-                    file.write(processed.infotext(p, 0))
+                if not p.disable_extra_networks:
+                    with devices.autocast():
+                        extra_networks.activate(p, p.extra_network_data)
 
-            for comment in model_hijack.comments:
-                p.comment(comment)
+                if p.scripts is not None:
+                    p.scripts.process_batch(
+                        p,
+                        batch_number=n,
+                        prompts=p.prompts,
+                        seeds=p.seeds,
+                        subseeds=p.subseeds,
+                    )
 
-            if p.n_iter > 1:
-                shared.state.job = f"Batch {n+1} out of {p.n_iter}"
+                p.setup_conds()
 
-            sd_models.apply_alpha_schedule_override(p.sd_model, p)
+                p.extra_generation_params.update(model_hijack.extra_generation_params)
 
-            with (
-                devices.without_autocast()
-                if devices.unet_needs_upcast
-                else devices.autocast()
-            ):
-                samples_ddim = p.sample(
-                    conditioning=p.c,
-                    unconditional_conditioning=p.uc,
-                    seeds=p.seeds,
-                    subseeds=p.subseeds,
-                    subseed_strength=p.subseed_strength,
-                    prompts=p.prompts,
-                )
+                # params.txt should be saved after scripts.process_batch, since the
+                # infotext could be modified by that callback
+                # Example: a wildcard processed by process_batch sets an extra model
+                # strength, which is saved as "Model Strength: 1.0" in the infotext
+                if n == 0 and not cmd_opts.no_prompt_history:
+                    with open(
+                        os.path.join(paths.data_path, "params.txt"), "w", encoding="utf8"
+                    ) as file:
+                        processed = Processed(p, [])
+                        file.write(processed.infotext(p, 0))
 
-            if p.scripts is not None:
-                ps = scripts.PostSampleArgs(samples_ddim)
-                p.scripts.post_sample(p, ps)
-                samples_ddim = ps.samples
+                for comment in model_hijack.comments:
+                    p.comment(comment)
 
-            if getattr(samples_ddim, "already_decoded", False):
-                x_samples_ddim = samples_ddim
-            else:
-                if opts.sd_vae_decode_method != "Full":
-                    p.extra_generation_params["VAE Decoder"] = opts.sd_vae_decode_method
-                x_samples_ddim = decode_latent_batch(
-                    p.sd_model,
-                    samples_ddim,
-                    target_device=devices.cpu,
-                    check_for_nans=True,
-                )
+                if p.n_iter > 1:
+                    shared.state.job = f"Batch {n+1} out of {p.n_iter}"
 
-            x_samples_ddim = torch.stack(x_samples_ddim).float()
-            x_samples_ddim = torch.clamp((x_samples_ddim + 1.0) / 2.0, min=0.0, max=1.0)
+                sd_models.apply_alpha_schedule_override(p.sd_model, p)
 
-            del samples_ddim
+                with (
+                    devices.without_autocast()
+                    if devices.unet_needs_upcast
+                    else devices.autocast()
+                ):
+                    samples_ddim = p.sample(
+                        conditioning=p.c,
+                        unconditional_conditioning=p.uc,
+                        seeds=p.seeds,
+                        subseeds=p.subseeds,
+                        subseed_strength=p.subseed_strength,
+                        prompts=p.prompts,
+                    )
 
-            if lowvram.is_enabled(shared.sd_model):
-                lowvram.send_everything_to_cpu()
+                if p.scripts is not None:
+                    ps = scripts.PostSampleArgs(samples_ddim)
+                    p.scripts.post_sample(p, ps)
+                    samples_ddim = ps.samples
 
-            devices.torch_gc()
+                if getattr(samples_ddim, "already_decoded", False):
+                    x_samples_ddim = samples_ddim
+                else:
+                    if opts.sd_vae_decode_method != "Full":
+                        p.extra_generation_params["VAE Decoder"] = opts.sd_vae_decode_method
+                    x_samples_ddim = decode_latent_batch(
+                        p.sd_model,
+                        samples_ddim,
+                        target_device=devices.cpu,
+                        check_for_nans=True,
+                    )
 
-            state.nextjob()
+                x_samples_ddim = torch.stack(x_samples_ddim).float()
+                x_samples_ddim = torch.clamp((x_samples_ddim + 1.0) / 2.0, min=0.0, max=1.0)
 
-            if p.scripts is not None:
-                p.scripts.postprocess_batch(p, x_samples_ddim, batch_number=n)
+                del samples_ddim
 
-                p.prompts = p.all_prompts[n * p.batch_size : (n + 1) * p.batch_size]
-                p.negative_prompts = p.all_negative_prompts[
-                    n * p.batch_size : (n + 1) * p.batch_size
-                ]
+                if lowvram.is_enabled(shared.sd_model):
+                    lowvram.send_everything_to_cpu()
 
-                batch_params = scripts.PostprocessBatchListArgs(list(x_samples_ddim))
-                p.scripts.postprocess_batch_list(p, batch_params, batch_number=n)
-                x_samples_ddim = batch_params.images
+                devices.torch_gc()
 
-            def infotext(index=0, use_main_prompt=False):
-                return create_infotext(
-                    p,
-                    p.prompts,
-                    p.seeds,
-                    p.subseeds,
-                    use_main_prompt=use_main_prompt,
-                    index=index,
-                    all_negative_prompts=p.negative_prompts,
-                )
+                state.nextjob()
 
-            save_samples = p.save_samples()
+                if p.scripts is not None:
+                    p.scripts.postprocess_batch(p, x_samples_ddim, batch_number=n)
+
+                    p.prompts = p.all_prompts[n * p.batch_size : (n + 1) * p.batch_size]
+                    p.negative_prompts = p.all_negative_prompts[
+                        n * p.batch_size : (n + 1) * p.batch_size
+                    ]
+
+                    batch_params = scripts.PostprocessBatchListArgs(list(x_samples_ddim))
+                    p.scripts.postprocess_batch_list(p, batch_params, batch_number=n)
+                    x_samples_ddim = batch_params.images
+
+                def infotext(index=0, use_main_prompt=False):
+                    return create_infotext(
+                        p,
+                        p.prompts,
+                        p.seeds,
+                        p.subseeds,
+                        use_main_prompt=use_main_prompt,
+                        index=index,
+                        all_negative_prompts=p.negative_prompts,
+                    )
 
-            for i, x_sample in enumerate(x_samples_ddim):
-                p.batch_index = i
+                save_samples = p.save_samples()
 
-                x_sample = 255.0 * np.moveaxis(x_sample.cpu().numpy(), 0, 2)
-                x_sample = x_sample.astype(np.uint8)
+                np_samples = [
+                    (255.0 * np.moveaxis(x_sample.cpu().numpy(), 0, 2)).astype(np.uint8)
+                    for x_sample in x_samples_ddim
+                ]
 
                 if p.restore_faces:
                     if save_samples and opts.save_images_before_face_restoration:
-                        images.save_image(
-                            Image.fromarray(x_sample),
-                            p.outpath_samples,
-                            "",
-                            p.seeds[i],
-                            p.prompts[i],
-                            opts.samples_format,
-                            info=infotext(i),
-                            p=p,
-                            suffix="-before-face-restoration",
-                        )
+                        for i, x_sample in enumerate(np_samples):
+                            p.batch_index = i
+                            image_saver.save_image(
+                                Image.fromarray(x_sample),
+                                p.outpath_samples,
+                                "",
+                                p.seeds[i],
+                                p.prompts[i],
+                                opts.samples_format,
+                                info=infotext(i),
+                                p=p,
+                                suffix="-before-face-restoration",
+                            )
 
                     devices.torch_gc()
 
-                    x_sample = modules.face_restoration.restore_faces(x_sample)
+                    # faces from all images of the batch are restored together
+                    np_samples = modules.face_restoration.restore_faces_batch(np_samples)
                     devices.torch_gc()
 
-                image = Image.fromarray(x_sample)
+                for i, x_sample in enumerate(np_samples):
+                    p.batch_index = i
 
-                if p.scripts is not None:
-                    pp = scripts.PostprocessImageArgs(image)
-                    p.scripts.postprocess_image(p, pp)
-                    image = pp.image
+                    image = Image.fromarray(x_sample)
 
-                mask_for_overlay = getattr(p, "mask_for_overlay", None)
+                    if p.scripts is not None:
+                        pp = scripts.PostprocessImageArgs(image)
+                        p.scripts.postprocess_image(p, pp)
+                        image = pp.image
 
-                if not shared.opts.overlay_inpaint:
-                    overlay_image = None
-                elif getattr(p, "overlay_images", None) is not None and i < len(
-                    p.overlay_images
-                ):
-                    overlay_image = p.overlay_images[i]
-                else:
-                    overlay_image = None
+                    mask_for_overlay = getattr(p, "mask_for_overlay", None)
 
-                if p.scripts is not None:
-                    ppmo = scripts.PostProcessMaskOverlayArgs(
-                        i, mask_for_overlay, overlay_image
-                    )
-                    p.scripts.postprocess_maskoverlay(p, ppmo)
-                    mask_for_overlay, overlay_image = (
-                        ppmo.mask_for_overlay,
-                        ppmo.overlay_image,
-                    )
+                    if not shared.opts.overlay_inpaint:
+                        overlay_image = None
+                    elif getattr(p, "overlay_images", None) is not None and i < len(
+                        p.overlay_images
+                    ):
+                        overlay_image = p.overlay_images[i]
+                    else:
+                        overlay_image = None
 
-                if p.color_corrections is not None and i < len(p.color_corrections):
-                    if save_samples and opts.save_images_before_color_correction:
-                        image_without_cc, _ = apply_overlay(
-                            image, p.paste_to, overlay_image
+                    if p.scripts is not None:
+                        ppmo = scripts.PostProcessMaskOverlayArgs(
+                            i, mask_for_overlay, overlay_image
                         )
-                        images.save_image(
-                            image_without_cc,
-                            p.outpath_samples,
-                            "",
-                            p.seeds[i],
-                            p.prompts[i],
-                            opts.samples_format,
-                            info=infotext(i),
-                            p=p,
-                            suffix="-before-color-correction",
+                        p.scripts.postprocess_maskoverlay(p, ppmo)
+                        mask_for_overlay, overlay_image = (
+                            ppmo.mask_for_overlay,
+                            ppmo.overlay_image,
                         )
-                    image = apply_color_correction(p.color_corrections[i], image)
-
-                # If the intention is to show the output from the model
-                # that is being composited over the original image,
-                # we need to keep the original image around
-                # and use it in the composite step.
-                image, original_denoised_image = apply_overlay(
-                    image, p.paste_to, overlay_image
-                )
-
-                if p.scripts is not None:
-                    pp = scripts.PostprocessImageArgs(image)
-                    p.scripts.postprocess_image_after_composite(p, pp)
-                    image = pp.image
-
-                if save_samples:
-                    images.save_image(
-                        image,
-                        p.outpath_samples,
-                        "",
-                        p.seeds[i],
-                        p.prompts[i],
-                        opts.samples_format,
-                        info=infotext(i),
-                        p=p,
-                    )
 
-                text = infotext(i)
-                infotexts.append(text)
-                if opts.enable_pnginfo:
-                    image.info["parameters"] = text
-                output_images.append(image)
-
-                if mask_for_overlay is not None:
-                    if opts.return_mask or opts.save_mask:
-                        image_mask = mask_for_overlay.convert("RGB")
-                        if save_samples and opts.save_mask:
-                            images.save_image(
-                                image_mask,
-                                p.outpath_samples,
-                                "",
-                                p.seeds[i],
-                                p.prompts[i],
-                                opts.samples_format,
-                                info=infotext(i),
-                                p=p,
-                                suffix="-mask",
+                    if p.color_corrections is not None and i < len(p.color_corrections):
+                        if save_samples and opts.save_images_before_color_correction:
+                            image_without_cc, _ = apply_overlay(
+                                image, p.paste_to, overlay_image
                             )
-                        if opts.return_mask:
-                            output_images.append(image_mask)
-
-                    if opts.return_mask_composite or opts.save_mask_composite:
-                        image_mask_composite = Image.composite(
-                            original_denoised_image.convert("RGBA").convert("RGBa"),
-                            Image.new("RGBa", image.size),
-                            images.resize_image(
-                                2, mask_for_overlay, image.width, image.height
-                            ).convert("L"),
-                        ).convert("RGBA")
-                        if save_samples and opts.save_mask_composite:
-                            images.save_image(
-                                image_mask_composite,
+                            image_saver.save_image(
+                                image_without_cc,
                                 p.outpath_samples,
                                 "",
                                 p.seeds[i],
@@ -1499,14 +1558,88 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                                 opts.samples_format,
                                 info=infotext(i),
                                 p=p,
-                                suffix="-mask-composite",
+                                suffix="-before-color-correction",
                             )
-                        if opts.return_mask_composite:
-                            output_images.append(image_mask_composite)
+                        image = apply_color_correction(p.color_corrections[i], image)
+
+                    # If the intention is to show the output from the model
+                    # that is being composited over the original image,
+                    # we need to keep the original image around
+                    # and use it in the composite step.
+                    image, original_denoised_image = apply_overlay(
+                        image, p.paste_to, overlay_image
+                    )
 
-            del x_samples_ddim
+                    if p.scripts is not None:
+                        pp = scripts.PostprocessImageArgs(image)
+                        p.scripts.postprocess_image_after_composite(p, pp)
+                        image = pp.image
 
-            devices.torch_gc()
+                    if save_samples:
+                        image_saver.save_image(
+                            image,
+                            p.outpath_samples,
+                            "",
+                            p.seeds[i],
+                            p.prompts[i],
+                            opts.samples_format,
+                            info=infotext(i),
+                            p=p,
+                        )
+
+                    text = infotext(i)
+                    infotexts.append(text)
+                    if opts.enable_pnginfo:
+                        image.info["parameters"] = text
+                    output_images.append(image)
+
+                    if mask_for_overlay is not None:
+                        if opts.return_mask or opts.save_mask:
+                            image_mask = mask_for_overlay.convert("RGB")
+                            if save_samples and opts.save_mask:
+                                image_saver.save_image(
+                                    image_mask,
+                                    p.outpath_samples,
+                                    "",
+                                    p.seeds[i],
+                                    p.prompts[i],
+                                    opts.samples_format,
+                                    info=infotext(i),
+                                    p=p,
+                                    suffix="-mask",
+                                )
+                            if opts.return_mask:
+                                output_images.append(image_mask)
+
+                        if opts.return_mask_composite or opts.save_mask_composite:
+                            image_mask_composite = Image.composite(
+                                original_denoised_image.convert("RGBA").convert("RGBa"),
+                                Image.new("RGBa", image.size),
+                                images.resize_image(
+                                    2, mask_for_overlay, image.width, image.height
+                                ).convert("L"),
+                            ).convert("RGBA")
+                            if save_samples and opts.save_mask_composite:
+                                image_saver.save_image(
+                                    image_mask_composite,
+                                    p.outpath_samples,
+                                    "",
+                                    p.seeds[i],
+                                    p.prompts[i],
+                                    opts.samples_format,
+                                    info=infotext(i),
+                                    p=p,
+                                    suffix="-mask-composite",
+                                )
+                            if opts.return_mask_composite:
+                                output_images.append(image_mask_composite)
+
+                del x_samples_ddim
+
+                devices.torch_gc()
+        finally:
+            # wait for background saves even if generation failed or was interrupted
+            image_saver.wait()
 
         if not infotexts:
             infotexts.append(Processed(p, []).infotext(p, 0))
@@ -2153,6 +2286,9 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
     initial_noise_multiplier: float = None
     latent_mask: Image = None
     force_task_id: str = None
+    init_images_batches: list = None
+    """if set, a list with init images for every iteration, used instead of init_images; images of each iteration are
+    encoded when it starts, and the last one may have fewer images than batch_size"""
 
     image_mask: Any = field(default=None, init=False)
 
@@ -2161,6 +2297,9 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
     init_img_hash: str = field(default=None, init=False)
     mask_for_overlay: Image = field(default=None, init=False)
     init_latent: torch.Tensor = field(default=None, init=False)
+    crop_region: tuple = field(default=None, init=False)
+    init_image_mask: Image = field(default=None, init=False)
+    color_corrections_from_init_images: bool = field(default=False, init=False)
 
     def __post_init__(self):
         super().__post_init__()
@@ -2250,14 +2389,33 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
                 )
                 self.mask_for_overlay = Image.fromarray(np_mask)
 
-            self.overlay_images = []
+        self.crop_region = crop_region
+        self.init_image_mask = image_mask
+        self.color_corrections_from_init_images = (
+            opts.img2img_color_correction and self.color_corrections is None
+        )
 
+        if self.init_images_batches is not None:
+            self.init_images = self.init_images_batches[0]
+
+        self.encode_init_images(all_seeds)
+
+    def setup_batch(self, n):
+        if self.init_images_batches is not None and n > 0:
+            self.init_images = self.init_images_batches[n]
+            self.encode_init_images(self.seeds)
+
+    def encode_init_images(self, seeds):
+        """Sets init_latent, image_conditioning and masks from init_images; seeds are used for latent noise fill."""
+
+        crop_region = self.crop_region
+        image_mask = self.init_image_mask
         latent_mask = self.latent_mask if self.latent_mask is not None else image_mask
 
-        add_color_corrections = (
-            opts.img2img_color_correction and self.color_corrections is None
-        )
-        if add_color_corrections:
+        if image_mask is not None:
+            self.overlay_images = []
+
+        if self.color_corrections_from_init_images:
             self.color_corrections = []
         imgs = []
         for img in self.init_images:
@@ -2302,7 +2460,7 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
                     if self.inpainting_fill == 0:
                         self.extra_generation_params["Masked content"] = "fill"
 
-            if add_color_corrections:
+            if self.color_corrections_from_init_images:
                 self.color_corrections.append(setup_color_correction(image))
 
             image = np.array(image).astype(np.float32) / 255.0
@@ -2310,7 +2468,9 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
 
             imgs.append(image)
 
-        if len(imgs) == 1:
+        if self.init_images_batches is not None:
+            batch_images = np.array(imgs)
+        elif len(imgs) == 1:
             batch_images = np.expand_dims(imgs[0], axis=0).repeat(
                 self.batch_size, axis=0
             )
@@ -2370,7 +2530,7 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
                     self.init_latent * self.mask
                     + create_random_tensors(
                         self.init_latent.shape[1:],
-                        all_seeds[0 : self.init_latent.shape[0]],
+                        seeds[0 : self.init_latent.shape[0]],
                     )
                     * self.nmask
                 )
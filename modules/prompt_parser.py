@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import bisect
 import re
 from collections import namedtuple
 import lark
@@ -349,6 +350,40 @@ def reconstruct_multicond_batch(c: MulticondLearnedConditioning, current_step):
     return conds_list, stacked
 
 
+class PrecomputedCondBatch:
+    """
+    Results of reconstruct_cond_batch or reconstruct_multicond_batch for all steps of sampling, built once before sampling.
+
+    The result only changes at steps where one of the schedules moves on to its next entry, so steps are split into
+    intervals between those points and the batch is built once for every interval. Getting the batch for a step is
+    then a binary search instead of scanning the schedules and stacking tensors on every step.
+    """
+
+    def __init__(self, c, reconstruct):
+        if isinstance(c, MulticondLearnedConditioning):
+            schedules = [composable_prompt.schedules for composable_prompts in c.batch for composable_prompt in composable_prompts]
+        else:
+            schedules = c
+
+        self.source = c
+        self.boundaries = sorted({entry.end_at_step for schedule in schedules for entry in schedule})
+
+        # any step of an interval produces the same batch, so its last step is used; the extra entry at the end
+        # is for steps past all schedules, for which reconstruct functions fall back to the first entry
+        self.batches = [reconstruct(c, step) for step in self.boundaries]
+        self.batches.append(reconstruct(c, self.boundaries[-1] + 1))
+
+    def get(self, current_step):
+        res = self.batches[bisect.bisect_left(self.boundaries, current_step)]
+
+        # callers are allowed to replace values in dict conds, so they get their own dict
+        if isinstance(res, tuple):
+            conds_list, stacked = res
+            return conds_list, DictWithShape(stacked, None) if isinstance(stacked, DictWithShape) else stacked
+
+        return DictWithShape(res, None) if isinstance(res, DictWithShape) else res
+
+
 re_attention = re.compile(r"""
 \\\(|
 \\\)|
@@ -96,6 +96,22 @@ def slerp(val, low, high):
     return res
 
 
+def randn_for_generators(generators, shape):
+    """Generate a tensor of shape (len(generators), *shape), with each generator producing one item of the batch.
+
+    The result is the same as that of calling randn_without_seed for every generator and stacking results."""
+
+    if shared.opts.randn_source == "NV":
+        return torch.asarray(rng_philox.randn_batch(generators, shape), device=devices.device)
+
+    # items are written straight into the batch, which is moved to the device, if needed, in one transfer
+    res = torch.empty((len(generators), *shape), device=generators[0].device if generators else devices.device)
+    for i, generator in enumerate(generators):
+        torch.randn(shape, generator=generator, out=res[i])
+
+    return res.to(devices.device)
+
+
 class ImageRNG:
     def __init__(self, shape, seeds, subseeds=None, subseed_strength=0.0, seed_resize_from_h=0, seed_resize_from_w=0):
         self.shape = tuple(map(int, shape))
@@ -112,55 +128,49 @@ class ImageRNG:
     def first(self):
         noise_shape = self.shape if self.seed_resize_from_h <= 0 or self.seed_resize_from_w <= 0 else (self.shape[0], int(self.seed_resize_from_h) // 8, int(self.seed_resize_from_w // 8))
 
-        xs = []
-
-        for i, (seed, generator) in enumerate(zip(self.seeds, self.generators)):
-            subnoise = None
-            if self.subseeds is not None and self.subseed_strength != 0:
-                subseed = 0 if i >= len(self.subseeds) else self.subseeds[i]
-                subnoise = randn(subseed, noise_shape)
-
-            if noise_shape != self.shape:
-                noise = randn(seed, noise_shape)
-            else:
-                noise = randn(seed, self.shape, generator=generator)
-
-            if subnoise is not None:
-                noise = slerp(self.subseed_strength, noise, subnoise)
-
-            if noise_shape != self.shape:
-                x = randn(seed, self.shape, generator=generator)
-                dx = (self.shape[2] - noise_shape[2]) // 2
-                dy = (self.shape[1] - noise_shape[1]) // 2
-                w = noise_shape[2] if dx >= 0 else noise_shape[2] + 2 * dx
-                h = noise_shape[1] if dy >= 0 else noise_shape[1] + 2 * dy
-                tx = 0 if dx < 0 else dx
-                ty = 0 if dy < 0 else dy
-                dx = max(-dx, 0)
-                dy = max(-dy, 0)
-
-                x[:, ty:ty + h, tx:tx + w] = noise[:, dy:dy + h, dx:dx + w]
-                noise = x
-
-            xs.append(noise)
+        # freshly created generators produce same numbers as randn(seed, ...), which seeds the global generator
+        if noise_shape != self.shape:
+            noise = randn_for_generators([create_generator(seed) for seed in self.seeds], noise_shape)
+        else:
+            noise = randn_for_generators(self.generators, self.shape)
+
+        if self.subseeds is not None and self.subseed_strength != 0:
+            subseeds = [0 if i >= len(self.subseeds) else self.subseeds[i] for i in range(len(self.seeds))]
+            subnoise = randn_for_generators([create_generator(subseed) for subseed in subseeds], noise_shape)
+
+            # slerp decides between interpolation methods using the whole image, so it's done for one image at a time
+            noise = torch.stack([slerp(self.subseed_strength, noise[i], subnoise[i]) for i in range(len(self.seeds))])
+
+        if noise_shape != self.shape:
+            x = randn_for_generators(self.generators, self.shape)
+            dx = (self.shape[2] - noise_shape[2]) // 2
+            dy = (self.shape[1] - noise_shape[1]) // 2
+            w = noise_shape[2] if dx >= 0 else noise_shape[2] + 2 * dx
+            h = noise_shape[1] if dy >= 0 else noise_shape[1] + 2 * dy
+            tx = 0 if dx < 0 else dx
+            ty = 0 if dy < 0 else dy
+            dx = max(-dx, 0)
+            dy = max(-dy, 0)
+
+            x[:, :, ty:ty + h, tx:tx + w] = noise[:, :, dy:dy + h, dx:dx + w]
+            noise = x
+
+        # leave the global generator in the same state as generating each image with randn(seed, ...) would
+        if self.seeds:
+            manual_seed(self.seeds[-1])
 
         eta_noise_seed_delta = shared.opts.eta_noise_seed_delta or 0
         if eta_noise_seed_delta:
             self.generators = [create_generator(seed + eta_noise_seed_delta) for seed in self.seeds]
 
-        return torch.stack(xs).to(shared.device)
+        return noise.to(shared.device)
 
     def next(self):
         if self.is_first:
             self.is_first = False
             return self.first()
 
-        xs = []
-        for generator in self.generators:
-            x = randn_without_seed(self.shape, generator=generator)
-            xs.append(x)
-
-        return torch.stack(xs).to(shared.device)
+        return randn_for_generators(self.generators, self.shape).to(shared.device)
 
 
 devices.randn = randn
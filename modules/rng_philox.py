@@ -74,6 +74,36 @@ def box_muller(x, y):
     return r1.astype(np.float32)
 
 
+def randn_batch(generators, shape):
+    """Generates normal random numbers of given shape for each generator in one vectorized pass.
+
+    Output for each generator is the same as that of its randn() call; offset of each generator is advanced by one.
+    Returns an array of shape (len(generators), *shape).
+    """
+
+    n = 1
+    for x in shape:
+        n *= x
+
+    # key and offset columns for every generator are laid out one after another, giving a (seed, counter) matrix
+    seeds = np.empty(len(generators), dtype=np.uint64)
+    offsets = np.empty(len(generators), dtype=np.uint32)
+    for i, generator in enumerate(generators):
+        seeds[i:i + 1].fill(generator.seed)
+        offsets[i:i + 1].fill(generator.offset)
+        generator.offset += 1
+
+    counter = np.zeros((4, n * len(generators)), dtype=np.uint32)
+    counter[0] = np.repeat(offsets, n)
+    counter[2] = np.tile(np.arange(n, dtype=np.uint32), len(generators))  # up to 2^32 numbers can be generated - if you want more you'd need to spill into counter[3]
+
+    key = uint32(np.repeat(seeds, n))
+
+    g = philox4_32(counter, key)
+
+    return box_muller(g[0], g[1]).reshape((len(generators), *shape))  # discard g[2] and g[3]
+
+
 class Generator:
     """RNG that produces same outputs as torch.randn(..., device='cuda') on CPU"""
 
@@ -84,19 +114,4 @@ class Generator:
     def randn(self, shape):
         """Generate a sequence of n standard normal random variables using the Philox 4x32 random number generator and the Box-Muller transform."""
 
-        n = 1
-        for x in shape:
-            n *= x
-
-        counter = np.zeros((4, n), dtype=np.uint32)
-        counter[0] = self.offset
-        counter[2] = np.arange(n, dtype=np.uint32)  # up to 2^32 numbers can be generated - if you want more you'd need to spill into counter[3]
-        self.offset += 1
-
-        key = np.empty(n, dtype=np.uint64)
-        key.fill(self.seed)
-        key = uint32(key)
-
-        g = philox4_32(counter, key)
-
-        return box_muller(g[0], g[1]).reshape(shape)  # discard g[2] and g[3]
+        return randn_batch([self], shape)[0]
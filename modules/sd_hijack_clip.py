@@ -1,5 +1,6 @@
 import math
-from collections import namedtuple
+import threading
+from collections import namedtuple, OrderedDict
 
 import torch
 
@@ -46,6 +47,10 @@ class FrozenCLIPEmbedderWithCustomWordsBase(torch.nn.Module):
         self.input_key = getattr(wrapped, 'input_key', 'txt')
         self.legacy_ucg_val = None
 
+        self.tokenize_line_cache = OrderedDict()
+        """LRU cache of tokenize_line results shared between requests; see cached_tokenize_line()"""
+        self.tokenize_line_cache_lock = threading.Lock()
+
     def empty_chunk(self):
         """creates an empty PromptChunk and returns it"""
 
@@ -176,6 +181,34 @@ class FrozenCLIPEmbedderWithCustomWordsBase(torch.nn.Module):
 
         return chunks, token_count
 
+    def cached_tokenize_line(self, line):
+        """
+        Same as tokenize_line(), but remembers results for the last opts.clip_tokenization_cache_size lines.
+        Results depend on loaded textual inversion embeddings and on emphasis and comma padding settings, so those are
+        part of the key. Returned chunks are shared between callers and must not be modified.
+        """
+
+        cache_size = opts.clip_tokenization_cache_size
+        if cache_size <= 0:
+            return self.tokenize_line(line)
+
+        key = (line, self.hijack.embedding_db.version, opts.emphasis, opts.comma_padding_backtrack)
+
+        with self.tokenize_line_cache_lock:
+            res = self.tokenize_line_cache.get(key)
+            if res is not None:
+                self.tokenize_line_cache.move_to_end(key)
+                return res
+
+        res = self.tokenize_line(line)
+
+        with self.tokenize_line_cache_lock:
+            self.tokenize_line_cache[key] = res
+            while len(self.tokenize_line_cache) > cache_size:
+                self.tokenize_line_cache.popitem(last=False)
+
+        return res
+
     def process_texts(self, texts):
         """
         Accepts a list of texts and calls tokenize_line() on each, with cache. Returns the list of results and maximum
@@ -190,7 +223,7 @@ class FrozenCLIPEmbedderWithCustomWordsBase(torch.nn.Module):
             if line in cache:
                 chunks = cache[line]
             else:
-                chunks, current_token_count = self.tokenize_line(line)
+                chunks, current_token_count = self.cached_tokenize_line(line)
                 token_count = max(current_token_count, token_count)
 
                 cache[line] = chunks
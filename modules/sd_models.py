@@ -25,6 +25,7 @@ from modules import (
     sd_models_config,
     sd_unet,
     sd_models_xl,
+    sd_models_cpu,
     cache,
     extra_networks,
     processing,
@@ -628,6 +629,8 @@ def load_model_weights(model, checkpoint_info: CheckpointInfo, state_dict, timer
     else:
         devices.fp8 = False
 
+    sd_models_cpu.apply(model, checkpoint_info, timer)
+
     devices.unet_needs_upcast = (
         shared.cmd_opts.upcast_sampling
         and devices.dtype == torch.float16
@@ -1173,7 +1176,8 @@ def reload_model_weights(sd_model=None, info=None, forced_reload=False):
     timer.record("find config")
 
     # 如果当前模型为 None 或者检查点配置与当前模型使用的配置不同，则加载新模型
-    if sd_model is None or checkpoint_config != sd_model.used_config:
+    # layers of a model optimized for CPU are replaced or converted, so new weights can't be loaded into it
+    if sd_model is None or checkpoint_config != sd_model.used_config or getattr(sd_model, "cpu_optimization", None):
         if sd_model is not None:
             send_model_to_trash(sd_model)
 
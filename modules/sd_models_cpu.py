@@ -0,0 +1,219 @@
+import os
+
+import safetensors
+import safetensors.torch
+import torch
+
+from modules import devices, errors, shared
+
+dynamic_linear_type = None
+
+
+def get_dynamic_linear_type():
+    global dynamic_linear_type
+
+    if dynamic_linear_type is None:
+        import torch.ao.nn.quantized.dynamic
+
+        dynamic_linear_type = torch.ao.nn.quantized.dynamic.Linear
+
+    return dynamic_linear_type
+
+
+def supports_bf16():
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def get_mode():
+    """returns CPU optimization to apply to the model: None, "int8" or "bf16"."""
+
+    mode = shared.opts.cpu_optimization
+    if mode == "None" or devices.device != devices.cpu:
+        return None
+
+    if mode == "Automatic":
+        return "bf16" if supports_bf16() else "int8"
+
+    return mode
+
+
+def apply_threads():
+    if shared.opts.cpu_threads > 0 and torch.get_num_threads() != shared.opts.cpu_threads:
+        torch.set_num_threads(shared.opts.cpu_threads)
+
+
+def optimized_modules(model):
+    """returns modules that are optimized for CPU: Unet and text encoder"""
+
+    text_model = getattr(model, "conditioner", None) or model.cond_stage_model
+    return {"unet": model.model.diffusion_model, "text_model": text_model}
+
+
+def replace_linear_layers(module, create):
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear):
+            setattr(module, name, create(child))
+        else:
+            replace_linear_layers(child, create)
+
+
+def quantize_linear(linear):
+    import torch.ao.quantization
+
+    linear.qconfig = torch.ao.quantization.default_dynamic_qconfig
+    return get_dynamic_linear_type().from_float(linear)
+
+
+def empty_quantized_linear(linear):
+    """creates a quantized layer of same shape as linear without computing quantized weights; those are loaded from cache"""
+
+    return get_dynamic_linear_type()(linear.in_features, linear.out_features, bias_=linear.bias is not None, dtype=torch.qint8)
+
+
+def int8_cache_filename(checkpoint_info):
+    # not .safetensors, so that the file is not listed as a checkpoint
+    return os.path.splitext(checkpoint_info.filename)[0] + ".cpu-int8.cache"
+
+
+def load_int8_cache(filename, checkpoint_info):
+    """returns {key: tensor} with quantized weights saved by save_int8_cache, or None if there are none for the checkpoint"""
+
+    if not shared.opts.cpu_optimization_cache or not os.path.exists(filename):
+        return None
+
+    try:
+        with safetensors.safe_open(filename, framework="pt", device="cpu") as file:
+            metadata = file.metadata() or {}
+            if metadata.get("sha256") != checkpoint_info.sha256 or metadata.get("torch") != torch.__version__:
+                return None
+
+            return {key: file.get_tensor(key) for key in file.keys()}
+    except Exception as e:
+        errors.display(e, f"loading quantized model from {filename}")
+        return None
+
+
+def save_int8_cache(filename, checkpoint_info, modules):
+    if not shared.opts.cpu_optimization_cache or checkpoint_info.sha256 is None:
+        return
+
+    # quantized tensors can't be stored in safetensors, so they are saved as int8 data with scale and zero point
+    tensors = {}
+    for prefix, module in modules.items():
+        for name, layer in module.named_modules():
+            if not isinstance(layer, get_dynamic_linear_type()):
+                continue
+
+            weight, bias = layer._weight_bias()
+            key = f"{prefix}.{name}"
+            tensors[f"{key}.weight"] = weight.int_repr()
+            tensors[f"{key}.scale"] = torch.tensor(weight.q_scale(), dtype=torch.float64)
+            tensors[f"{key}.zero_point"] = torch.tensor(weight.q_zero_point(), dtype=torch.int64)
+            if bias is not None:
+                tensors[f"{key}.bias"] = bias.contiguous()
+
+    try:
+        safetensors.torch.save_file(tensors, filename, metadata={"sha256": checkpoint_info.sha256, "torch": torch.__version__})
+    except Exception as e:
+        errors.display(e, f"saving quantized model to {filename}")
+
+
+def int8_cache_matches(modules, tensors):
+    """returns True if tensors saved by save_int8_cache have quantized weights for exactly the Linear layers of modules"""
+
+    expected = set()
+    for prefix, module in modules.items():
+        for name, layer in module.named_modules():
+            if not isinstance(layer, torch.nn.Linear):
+                continue
+
+            key = f"{prefix}.{name}"
+            weight = tensors.get(f"{key}.weight")
+            if weight is None or weight.shape != layer.weight.shape:
+                return False
+
+            expected.update([f"{key}.weight", f"{key}.scale", f"{key}.zero_point"])
+            if layer.bias is not None:
+                expected.add(f"{key}.bias")
+
+    return expected == set(tensors)
+
+
+def load_quantized_weights(modules, tensors):
+    for prefix, module in modules.items():
+        for name, layer in module.named_modules():
+            if not isinstance(layer, get_dynamic_linear_type()):
+                continue
+
+            key = f"{prefix}.{name}"
+            weight = torch._make_per_tensor_quantized_tensor(tensors[f"{key}.weight"], tensors[f"{key}.scale"].item(), tensors[f"{key}.zero_point"].item())
+            layer.set_weight_bias(weight, tensors.get(f"{key}.bias"))
+
+
+def apply_int8(model, checkpoint_info):
+    modules = optimized_modules(model)
+    filename = int8_cache_filename(checkpoint_info)
+
+    cached = load_int8_cache(filename, checkpoint_info)
+    if cached is not None and not int8_cache_matches(modules, cached):
+        # for example, same checkpoint loaded with a different config; the cache is made again below
+        print(f"Quantized model in {filename} does not match the model, quantizing again")
+        cached = None
+
+    if cached is not None:
+        for module in modules.values():
+            replace_linear_layers(module, empty_quantized_linear)
+
+        load_quantized_weights(modules, cached)
+
+        print(f"Loaded quantized model from {filename}")
+        return
+
+    for module in modules.values():
+        replace_linear_layers(module, quantize_linear)
+
+    save_int8_cache(filename, checkpoint_info, modules)
+
+
+def apply_bf16(model):
+    for module in optimized_modules(model).values():
+        module.to(torch.bfloat16)
+
+
+def apply(model, checkpoint_info, timer):
+    """
+    Optimizes the model for running on CPU, if enabled in settings.
+
+    int8 mode replaces Linear layers of Unet and text encoder with dynamically quantized ones; the quantized weights
+    are saved next to the checkpoint so they do not have to be computed again. bf16 mode converts Unet and text
+    encoder to bfloat16; devices.autocast uses manual_cast to run the rest of the model in bfloat16 with it.
+    """
+
+    devices.cpu_bf16 = False
+    model.cpu_optimization = None
+
+    mode = get_mode()
+    if mode is None:
+        return
+
+    if devices.fp8 or devices.dtype_unet != torch.float32:
+        print("CPU optimization requires the model to be loaded in float32; use --no-half with it")
+        return
+
+    apply_threads()
+
+    if shared.opts.cpu_channels_last:
+        model.model.diffusion_model.to(memory_format=torch.channels_last)
+
+    if mode == "bf16":
+        apply_bf16(model)
+        devices.cpu_bf16 = True
+        devices.dtype_unet = torch.bfloat16
+    else:
+        apply_int8(model, checkpoint_info)
+
+    model.cpu_optimization = mode
+    timer.record(f"apply CPU {mode}")
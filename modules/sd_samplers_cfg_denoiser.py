@@ -58,6 +58,24 @@ class CFGDenoiser(torch.nn.Module):
         self.model_wrap = None
         self.p = None
 
+        self.precomputed_conds = {}
+        """maps id of cond/uncond objects to prompt_parser.PrecomputedCondBatch made for them"""
+
+        self.batch_indexes = {}
+        """cache for index tensors used to gather latents for the batch, see get_batch_index"""
+
+        self.cfg_truncation_step = 0.0
+        """fraction of sampling steps after which the unconditional (negative prompt) pass is no longer done; 0 = disable"""
+
+        self.cfg_truncation_sigma = 0.0
+        """sigma below which the unconditional pass is no longer done; 0 = disable"""
+
+        self.cfg_truncation_tolerance = 0.0
+        """relative difference between cond and uncond predictions below which the unconditional pass is no longer done; 0 = disable"""
+
+        self.cfg_truncated_at = None
+        """step from which the unconditional pass is skipped, or None if guidance was not truncated"""
+
         # NOTE: masking before denoising can cause the original latents to be oversmoothed
         # as the original latents do not have noise
         self.mask_before_denoising = False
@@ -92,6 +110,58 @@ class CFGDenoiser(torch.nn.Module):
         self.sampler.sampler_extra_args['cond'] = c
         self.sampler.sampler_extra_args['uncond'] = uc
 
+    def get_precomputed_cond(self, c, reconstruct):
+        """returns prompt_parser.PrecomputedCondBatch for c, building it when first asked for c"""
+
+        res = self.precomputed_conds.get(id(c))
+        if res is None or res.source is not c:
+            res = prompt_parser.PrecomputedCondBatch(c, reconstruct)
+            self.precomputed_conds[id(c)] = res
+
+        return res
+
+    def reconstruct_conds(self, cond, uncond):
+        if not shared.opts.precompute_cond_batch:
+            conds_list, tensor = prompt_parser.reconstruct_multicond_batch(cond, self.step)
+            uncond = prompt_parser.reconstruct_cond_batch(uncond, self.step)
+            return conds_list, tensor, uncond
+
+        conds_list, tensor = self.get_precomputed_cond(cond, prompt_parser.reconstruct_multicond_batch).get(self.step)
+        uncond = self.get_precomputed_cond(uncond, prompt_parser.reconstruct_cond_batch).get(self.step)
+        return conds_list, tensor, uncond
+
+    def get_batch_index(self, indexes, device):
+        """returns a tensor with indexes, for gathering pictures from a batch in a single indexing operation"""
+
+        key = (tuple(indexes), device)
+        res = self.batch_indexes.get(key)
+        if res is None:
+            res = torch.tensor(indexes, dtype=torch.long, device=device)
+            self.batch_indexes[key] = res
+
+        return res
+
+    def check_cfg_truncation(self, sigma):
+        """decides, before the step, whether guidance should be truncated based on the step fraction or sigma"""
+
+        if self.cfg_truncated_at is not None:
+            return
+
+        if self.cfg_truncation_step > 0 and self.total_steps and self.step >= self.cfg_truncation_step * self.total_steps:
+            self.cfg_truncated_at = self.step
+        elif self.cfg_truncation_sigma > 0 and sigma[0] < self.cfg_truncation_sigma:
+            self.cfg_truncated_at = self.step
+
+    def check_cfg_convergence(self, cond_out, uncond_out):
+        """decides, after a full step, whether predictions with and without negative prompt are close enough to stop doing both"""
+
+        if self.cfg_truncated_at is not None or self.cfg_truncation_tolerance <= 0:
+            return
+
+        difference = (torch.linalg.vector_norm(cond_out - uncond_out) / torch.linalg.vector_norm(uncond_out).clamp(min=1e-8)).item()
+        if difference < self.cfg_truncation_tolerance:
+            self.cfg_truncated_at = self.step + 1
+
     def pad_cond_uncond(self, cond, uncond):
         empty = shared.sd_model.cond_stage_model_empty_prompt
         num_repeats = (cond.shape[1] - uncond.shape[1]) // empty.shape[1]
@@ -160,8 +230,7 @@ class CFGDenoiser(torch.nn.Module):
         # so is_edit_model is set to False to support AND composition.
         is_edit_model = shared.sd_model.cond_stage_key == "edit" and self.image_cfg_scale is not None and self.image_cfg_scale != 1.0
 
-        conds_list, tensor = prompt_parser.reconstruct_multicond_batch(cond, self.step)
-        uncond = prompt_parser.reconstruct_cond_batch(uncond, self.step)
+        conds_list, tensor, uncond = self.reconstruct_conds(cond, uncond)
 
         assert not is_edit_model or all(len(conds) == 1 for conds in conds_list), "AND is not supported for InstructPix2Pix checkpoint (unless using Image CFG scale = 1.0)"
 
@@ -194,14 +263,20 @@ class CFGDenoiser(torch.nn.Module):
             else:
                 make_condition_dict = lambda c_crossattn, c_concat: {"c_crossattn": [c_crossattn], "c_concat": [c_concat]}
 
+        # picture i of the batch is repeated once for every AND-composed prompt it has
+        repeat_indexes = [i for i, n in enumerate(repeats) for _ in range(n)]
+
+        def repeat_for_conds(t):
+            return t[self.get_batch_index(repeat_indexes, t.device)]
+
         if not is_edit_model:
-            x_in = torch.cat([torch.stack([x[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [x])
-            sigma_in = torch.cat([torch.stack([sigma[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [sigma])
-            image_cond_in = torch.cat([torch.stack([image_cond[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [image_uncond])
+            x_in = torch.cat([repeat_for_conds(x), x])
+            sigma_in = torch.cat([repeat_for_conds(sigma), sigma])
+            image_cond_in = torch.cat([repeat_for_conds(image_cond), image_uncond])
         else:
-            x_in = torch.cat([torch.stack([x[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [x] + [x])
-            sigma_in = torch.cat([torch.stack([sigma[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [sigma] + [sigma])
-            image_cond_in = torch.cat([torch.stack([image_cond[i] for _ in range(n)]) for i, n in enumerate(repeats)] + [image_uncond] + [torch.zeros_like(self.init_latent)])
+            x_in = torch.cat([repeat_for_conds(x), x, x])
+            sigma_in = torch.cat([repeat_for_conds(sigma), sigma, sigma])
+            image_cond_in = torch.cat([repeat_for_conds(image_cond), image_uncond, torch.zeros_like(self.init_latent)])
 
         denoiser_params = CFGDenoiserParams(x_in, image_cond_in, sigma_in, state.sampling_step, state.sampling_steps, tensor, uncond, self)
         cfg_denoiser_callback(denoiser_params)
@@ -212,11 +287,20 @@ class CFGDenoiser(torch.nn.Module):
         uncond = denoiser_params.text_uncond
         skip_uncond = False
 
+        if not is_edit_model:
+            self.check_cfg_truncation(sigma)
+
+        if self.cfg_truncated_at is not None and not is_edit_model:
+            skip_uncond = True
+
         # alternating uncond allows for higher thresholds without the quality loss normally expected from raising it
         if self.step % 2 and s_min_uncond > 0 and sigma[0] < s_min_uncond and not is_edit_model:
             skip_uncond = True
+
+        if skip_uncond:
             x_in = x_in[:-batch_size]
             sigma_in = sigma_in[:-batch_size]
+            image_cond_in = image_cond_in[:-batch_size]
 
         self.padded_cond_uncond = False
         self.padded_cond_uncond_v0 = False
@@ -259,9 +343,12 @@ class CFGDenoiser(torch.nn.Module):
                 x_out[-uncond.shape[0]:] = self.inner_model(x_in[-uncond.shape[0]:], sigma_in[-uncond.shape[0]:], cond=make_condition_dict(uncond, image_cond_in[-uncond.shape[0]:]))
 
         denoised_image_indexes = [x[0][0] for x in conds_list]
+        denoised_image_index = self.get_batch_index(denoised_image_indexes, x_out.device)
         if skip_uncond:
-            fake_uncond = torch.cat([x_out[i:i+1] for i in denoised_image_indexes])
+            fake_uncond = x_out[denoised_image_index]
             x_out = torch.cat([x_out, fake_uncond])  # we skipped uncond denoising, so we put cond-denoised image to where the uncond-denoised image should be
+        elif not is_edit_model:
+            self.check_cfg_convergence(x_out[denoised_image_index], x_out[-uncond.shape[0]:])
 
         denoised_params = CFGDenoisedParams(x_out, state.sampling_step, state.sampling_steps, self.inner_model)
         cfg_denoised_callback(denoised_params)
@@ -279,14 +366,14 @@ class CFGDenoiser(torch.nn.Module):
         if not self.mask_before_denoising and self.mask is not None:
             denoised = apply_blend(denoised)
 
-        self.sampler.last_latent = self.get_pred_x0(torch.cat([x_in[i:i + 1] for i in denoised_image_indexes]), torch.cat([x_out[i:i + 1] for i in denoised_image_indexes]), sigma)
+        self.sampler.last_latent = self.get_pred_x0(x_in[denoised_image_index], x_out[denoised_image_index], sigma)
 
         if opts.live_preview_content == "Prompt":
             preview = self.sampler.last_latent
         elif opts.live_preview_content == "Negative prompt":
             preview = self.get_pred_x0(x_in[-uncond.shape[0]:], x_out[-uncond.shape[0]:], sigma)
         else:
-            preview = self.get_pred_x0(torch.cat([x_in[i:i+1] for i in denoised_image_indexes]), torch.cat([denoised[i:i+1] for i in denoised_image_indexes]), sigma)
+            preview = self.get_pred_x0(x_in[denoised_image_index], denoised[denoised_image_index], sigma)
 
         sd_samplers_common.store_latent(preview)
 
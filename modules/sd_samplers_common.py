@@ -3,7 +3,7 @@ from collections import namedtuple
 import numpy as np
 import torch
 from PIL import Image
-from modules import devices, images, sd_vae_approx, sd_samplers, sd_vae_taesd, shared, sd_models
+from modules import devices, images, sd_vae_approx, sd_samplers, sd_vae_taesd, sd_vae_tiled, shared, sd_models
 from modules.shared import opts, state
 import k_diffusion.sampling
 
@@ -55,7 +55,10 @@ def samples_to_images_tensor(sample, approximation=None, model=None):
         if model is None:
             model = shared.sd_model
         with devices.without_autocast(): # fixes an issue with unstable VAEs that are flaky even in fp32
-            x_sample = model.decode_first_stage(sample.to(model.first_stage_model.dtype))
+            if sd_vae_tiled.use_tiled(sample.shape[2] * 8, sample.shape[3] * 8):
+                x_sample = sd_vae_tiled.decode(model, sample.to(model.first_stage_model.dtype))
+            else:
+                x_sample = model.decode_first_stage(sample.to(model.first_stage_model.dtype))
 
     return x_sample
 
@@ -99,7 +102,9 @@ def images_tensor_to_samples(image, approximation=None, model=None):
 
         image = image.to(shared.device, dtype=devices.dtype_vae)
         image = image * 2 - 1
-        if len(image) > 1:
+        if sd_vae_tiled.use_tiled(image.shape[2], image.shape[3]):
+            x_latent = sd_vae_tiled.encode(model, image)
+        elif len(image) > 1:
             x_latent = torch.stack([
                 model.get_first_stage_encoding(
                     model.encode_first_stage(torch.unsqueeze(img, 0))
@@ -292,6 +297,10 @@ class Sampler:
         self.model_wrap_cfg.image_cfg_scale = getattr(p, 'image_cfg_scale', None)
         self.eta = p.eta if p.eta is not None else getattr(opts, self.eta_option_field, 0.0)
         self.s_min_uncond = getattr(p, 's_min_uncond', 0.0)
+        self.model_wrap_cfg.cfg_truncation_step = getattr(p, 'cfg_truncation_step', 0.0) or 0.0
+        self.model_wrap_cfg.cfg_truncation_sigma = getattr(p, 'cfg_truncation_sigma', 0.0) or 0.0
+        self.model_wrap_cfg.cfg_truncation_tolerance = getattr(p, 'cfg_truncation_tolerance', 0.0) or 0.0
+        self.model_wrap_cfg.cfg_truncated_at = None
 
         k_diffusion.sampling.torch = TorchHijack(p)
 
@@ -353,3 +362,6 @@ class Sampler:
 
         if self.model_wrap_cfg.padded_cond_uncond_v0:
             p.extra_generation_params["Pad conds v0"] = True
+
+        if self.model_wrap_cfg.cfg_truncated_at is not None:
+            p.extra_generation_params["Hires CFG truncated at" if getattr(p, 'is_hr_pass', False) else "CFG truncated at"] = self.model_wrap_cfg.cfg_truncated_at
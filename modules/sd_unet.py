@@ -82,6 +82,10 @@ class SdUnet(torch.nn.Module):
     def deactivate(self):
         pass
 
+    def add_infotext(self, p):
+        """called before generation; may add parameters of the Unet to p.extra_generation_params"""
+        pass
+
 
 def create_unet_forward(original_forward):
     def UNetModel_forward(self, x, timesteps=None, context=None, *args, **kwargs):
@@ -0,0 +1,199 @@
+import os
+import re
+import time
+
+import ldm.modules.diffusionmodules.openaimodel
+import torch
+
+from modules import devices, errors, sd_hijack, sd_unet, shared
+from modules.cache import cache_dir
+
+
+class CompiledUnetOption(sd_unet.SdUnetOption):
+    """
+    Unet option that runs the checkpoint's own Unet through torch.compile.
+
+    Inductor's on-disk cache is kept in a directory per checkpoint and dtype. With torch versions that have the FX graph
+    cache, whole compiled graphs are reused from it across restarts; with older versions, only generated kernels are,
+    and tracing is repeated. Shapes listed in settings are compiled when the option is activated, which happens when the
+    model is loaded.
+    """
+
+    def __init__(self, label, mode):
+        self.label = label
+        self.mode = mode
+
+    def create_unet(self):
+        return CompiledUnet(self.mode)
+
+
+class CompiledUnet(sd_unet.SdUnet):
+    def __init__(self, mode):
+        super().__init__()
+
+        self.mode = mode
+        self.compiled = None
+        self.original_forward = None
+        self.shapes = {}
+        """{(latent height, latent width, batch size, context length, shape of y, dtype): True if compiled successfully}"""
+
+        self.stats = {"compiled shapes": 0, "compile seconds": 0.0, "eager calls": 0, "failures": 0}
+
+    def activate(self):
+        import torch._dynamo
+        import torch._inductor.config
+
+        unet = shared.sd_model.model.diffusion_model
+
+        # the option uses checkpoint's Unet, which sd_unet.apply_unet has just moved to CPU
+        if not shared.sd_model.lowvram:
+            unet.to(devices.device)
+
+        checkpoint_info = shared.sd_model.sd_checkpoint_info
+        checkpoint_key = checkpoint_info.shorthash or checkpoint_info.model_name
+        dtype_name = str(devices.dtype_unet).replace("torch.", "")
+
+        set_inductor_cache_dir(os.path.join(cache_dir, "torch-compile", f"{checkpoint_key}-{dtype_name}"))
+        if hasattr(torch._inductor.config, "fx_graph_cache"):
+            torch._inductor.config.fx_graph_cache = True
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, shared.opts.torch_compile_max_shapes)
+
+        is_ldm = isinstance(unet, ldm.modules.diffusionmodules.openaimodel.UNetModel)
+        self.original_forward = sd_hijack.ldm_original_forward if is_ldm else sd_hijack.sgm_original_forward
+
+        def run_unet(x, timesteps, context, *args, **kwargs):
+            return self.original_forward(unet, x, timesteps, context, *args, **kwargs)
+
+        self.compiled = torch.compile(run_unet, mode=None if self.mode == "default" else self.mode, dynamic=False)
+        self.warmup()
+
+    def deactivate(self):
+        import torch._dynamo
+
+        self.compiled = None
+        self.shapes.clear()
+        torch._dynamo.reset()
+
+    def add_infotext(self, p):
+        p.extra_generation_params["Unet compile"] = self.mode
+
+    def warmup(self):
+        shapes = parse_warmup_shapes(shared.opts.torch_compile_warmup_shapes)
+        if not shapes:
+            return
+
+        unet = shared.sd_model.model.diffusion_model
+        empty_cond = shared.sd_model.cond_stage_model_empty_prompt
+
+        for width, height, batch_size in shapes:
+            # with batch cond/uncond enabled, the Unet sees prompt and negative prompt in one batch
+            batch = batch_size * 2 if shared.opts.batch_cond_uncond else batch_size
+
+            # samplers keep latents in float32
+            x = torch.zeros((batch, unet.in_channels, height // 8, width // 8), device=devices.device, dtype=torch.float32)
+            timesteps = torch.full((batch,), 999, device=devices.device, dtype=torch.long)
+            context = empty_cond.to(device=devices.device, dtype=devices.dtype_unet).repeat((batch, 1, 1))
+            kwargs = {}
+            if unet.num_classes is not None:
+                kwargs["y"] = torch.zeros((batch, unet.adm_in_channels), device=devices.device, dtype=devices.dtype_unet)
+
+            print(f"Warming up compiled Unet for {width}x{height}, batch size {batch_size}")
+            with torch.no_grad(), devices.autocast():
+                self.forward(x, timesteps, context, **kwargs)
+
+    def shape_key(self, x, context, y=None):
+        """every distinct key is a separate compiled graph: prompts longer than 75 tokens change the context length"""
+        return x.shape[2], x.shape[3], x.shape[0], context.shape[1], None if y is None else tuple(y.shape), x.dtype
+
+    def describe_shape(self, key):
+        height, width, batch_size, context_length, _, dtype = key
+        return f"{dtype} {width * 8}x{height * 8}, batch {batch_size}, context {context_length}"
+
+    def forward(self, x, timesteps, context, *args, **kwargs):
+        unet = shared.sd_model.model.diffusion_model
+
+        # y, the class/size conditioning of SDXL, follows context in the Unet's signature
+        key = self.shape_key(x, context, kwargs.get("y", args[0] if args else None))
+        compiled = self.shapes.get(key)
+
+        if compiled is None:
+            # every new shape is a recompile; past the limit, new shapes run without compilation
+            if sum(self.shapes.values()) >= shared.opts.torch_compile_max_shapes:
+                print(f"Compiled Unet: limit of {shared.opts.torch_compile_max_shapes} shapes reached, not compiling for {self.describe_shape(key)}")
+                self.shapes[key] = False
+            else:
+                t0 = time.time()
+                try:
+                    res = self.compiled(x, timesteps, context, *args, **kwargs)
+                except Exception as e:
+                    errors.display(e, "compiling Unet")
+                    self.shapes[key] = False
+                    self.stats["failures"] += 1
+                else:
+                    elapsed = time.time() - t0
+                    self.shapes[key] = True
+                    self.stats["compiled shapes"] += 1
+                    self.stats["compile seconds"] += elapsed
+                    print(f"Compiled Unet for {self.describe_shape(key)} in {elapsed:.1f}s; {self.format_stats()}")
+                    return res
+
+        elif compiled:
+            return self.compiled(x, timesteps, context, *args, **kwargs)
+
+        self.stats["eager calls"] += 1
+        return self.original_forward(unet, x, timesteps, context, *args, **kwargs)
+
+    def format_stats(self):
+        return ", ".join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in self.stats.items())
+
+
+def set_inductor_cache_dir(path):
+    """
+    Points inductor's on-disk cache to path. Inductor reads TORCHINDUCTOR_CACHE_DIR through a function that some torch
+    versions memoize, so the memoized value is dropped as well, which makes the change apply to later compilations.
+    """
+
+    import torch._inductor.codecache
+
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = path
+
+    modules = [torch._inductor.codecache]
+    try:
+        import torch._inductor.utils
+        modules.append(torch._inductor.utils)
+    except ImportError:
+        pass
+
+    for module in modules:
+        cache_clear = getattr(getattr(module, "cache_dir", None), "cache_clear", None)
+        if cache_clear is not None:
+            cache_clear()
+
+
+re_warmup_shape = re.compile(r"^\s*(\d+)\s*x\s*(\d+)\s*(?:x\s*(\d+))?\s*$")
+
+
+def parse_warmup_shapes(text):
+    """parses a comma-separated list of WIDTHxHEIGHT or WIDTHxHEIGHTxBATCH into a list of (width, height, batch size) tuples"""
+
+    res = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+
+        m = re_warmup_shape.match(part)
+        if m is None:
+            print(f"Invalid shape for compiled Unet warm-up: {part.strip()}")
+            continue
+
+        res.append((int(m.group(1)), int(m.group(2)), int(m.group(3) or 1)))
+
+    return res
+
+
+def list_unets(res):
+    if not hasattr(torch, "compile"):
+        return
+
+    for mode in ["default", "reduce-overhead", "max-autotune"]:
+        res.append(CompiledUnetOption(f"torch.compile ({mode})", mode))
@@ -0,0 +1,125 @@
+import ldm.modules.diffusionmodules.openaimodel
+import ldm.modules.diffusionmodules.util
+import sgm.modules.diffusionmodules.util
+
+from modules import devices, sd_hijack_unet, sd_unet, shared
+from modules.shared import state
+
+
+class DeepCacheUnetOption(sd_unet.SdUnetOption):
+    """
+    Unet option that runs the checkpoint's own Unet, but only computes it fully on some of the sampling steps.
+
+    High-level features produced by deep Unet blocks change little between adjacent steps. On a full step, the output
+    of the deep part of the Unet is remembered; on the steps in between, only the first `depth` input blocks and the
+    last `depth` output blocks are computed, and the remembered features are used in place of everything in between.
+    """
+
+    def __init__(self, label, interval, depth):
+        self.label = label
+        self.interval = interval
+        """full Unet is computed on every interval-th sampling step"""
+
+        self.depth = depth
+        """number of shallow input and output blocks that are computed on every step"""
+
+    def create_unet(self):
+        return DeepCacheUnet(self.interval, self.depth)
+
+
+class DeepCacheUnet(sd_unet.SdUnet):
+    def __init__(self, interval, depth):
+        super().__init__()
+
+        self.interval = interval
+        self.depth = depth
+        self.cache = {}
+        self.current_step = None
+        self.calls_in_step = 0
+
+    def activate(self):
+        # the option uses checkpoint's Unet, which sd_unet.apply_unet has just moved to CPU
+        if not shared.sd_model.lowvram:
+            shared.sd_model.model.diffusion_model.to(devices.device)
+
+    def deactivate(self):
+        self.cache.clear()
+
+    def add_infotext(self, p):
+        p.extra_generation_params["DeepCache"] = f"interval {self.interval}, depth {self.depth}"
+
+    def next_call(self):
+        """returns a tuple of (key identifying this call within a sampling step, whether this step must compute the full Unet)"""
+
+        step = (state.job_timestamp, state.job_no, state.sampling_steps, state.sampling_step)
+        if step != self.current_step:
+            self.current_step = step
+            self.calls_in_step = 0
+
+        # the Unet can be called several times per step: for separate cond/uncond batches, or by second order samplers
+        key = self.calls_in_step
+        self.calls_in_step += 1
+
+        return key, state.sampling_step % self.interval == 0
+
+    def forward(self, x, timesteps, context, *args, y=None, **kwargs):
+        unet = shared.sd_model.model.diffusion_model
+
+        is_ldm = isinstance(unet, ldm.modules.diffusionmodules.openaimodel.UNetModel)
+        util = ldm.modules.diffusionmodules.util if is_ldm else sgm.modules.diffusionmodules.util
+
+        key, full = self.next_call()
+        cached = self.cache.get(key)
+        cache_shape = (x.shape, getattr(context, 'shape', None))
+        if cached is None or cached[0] != cache_shape:
+            full = True
+
+        depth = max(1, min(self.depth, len(unet.input_blocks) - 1))
+        output_start = len(unet.output_blocks) - depth
+
+        t_emb = util.timestep_embedding(timesteps, unet.model_channels, repeat_only=False)
+        emb = unet.time_embed(t_emb)
+
+        if unet.num_classes is not None:
+            emb = emb + unet.label_emb(y)
+
+        h = x.type(unet.dtype) if is_ldm else x
+
+        hs = []
+        for module in unet.input_blocks if full else unet.input_blocks[:depth]:
+            h = module(h, emb, context)
+            hs.append(h)
+
+        if full:
+            h = unet.middle_block(h, emb, context)
+        else:
+            h = cached[1]
+
+        for i, module in enumerate(unet.output_blocks):
+            if i < output_start and not full:
+                continue
+
+            h = sd_hijack_unet.th.cat([h, hs.pop()], dim=1)
+            h = module(h, emb, context)
+
+            if full and i == output_start - 1:
+                self.cache[key] = (cache_shape, h)
+
+        h = h.type(x.dtype)
+
+        if getattr(unet, 'predict_codebook_ids', False):
+            return unet.id_predictor(h)
+
+        return unet.out(h)
+
+
+deepcache_presets = {
+    "quality": (2, 3),
+    "balanced": (3, 2),
+    "speed": (5, 1),
+}
+
+
+def list_unets(res):
+    for name, (interval, depth) in deepcache_presets.items():
+        res.append(DeepCacheUnetOption(f"DeepCache ({name})", interval, depth))
@@ -0,0 +1,158 @@
+"""
+Tiled VAE encoding and decoding for large images.
+
+The image is processed in overlapping tiles that are blended together. GroupNorm layers normally compute statistics
+over the whole image, so computing them per tile makes tiles differ in color and brightness; instead, statistics are
+collected from a downscaled copy of the whole image and used for every tile.
+"""
+import contextlib
+
+import torch
+from ldm.modules.distributions.distributions import DiagonalGaussianDistribution
+
+from modules import shared
+
+tile_padding = 4
+"""extra latent pixels around each tile given to VAE as context and cropped from its output"""
+
+tile_overlap = 8
+"""latent pixels shared by adjacent tiles, where their outputs are blended"""
+
+
+def use_tiled(height, width):
+    """returns True if an image of given size in pixels should be processed with tiled VAE"""
+
+    threshold = shared.opts.sd_vae_tiled_threshold
+    return threshold > 0 and height * width > threshold * 1024 * 1024
+
+
+def tile_positions(size, tile, overlap):
+    if size <= tile:
+        return [0]
+
+    positions = list(range(0, size - tile, tile - overlap))
+    return positions + [size - tile]
+
+
+def blend_weights(height, width, overlap, device):
+    """weights that fall off linearly over overlap pixels on every side of the tile"""
+
+    def ramp(n):
+        i = torch.arange(n, device=device, dtype=torch.float32)
+        return torch.minimum(torch.minimum(i + 1, n - i), torch.tensor(float(overlap), device=device)) / overlap
+
+    return ramp(height)[:, None] * ramp(width)[None, :]
+
+
+def collect_group_norm_stats(vae, fn, x):
+    """runs fn(x) and returns {GroupNorm module: (mean, reciprocal of std)} for every GroupNorm layer of vae it went through"""
+
+    stats = {}
+
+    def hook(module, args):
+        x = args[0].float()
+        var, mean = torch.var_mean(x.reshape(x.shape[0], module.num_groups, -1), dim=2, unbiased=False)
+        stats[module] = (mean, torch.rsqrt(var + module.eps))
+
+    hooks = [module.register_forward_pre_hook(hook) for module in vae.modules() if isinstance(module, torch.nn.GroupNorm)]
+    try:
+        fn(x)
+    finally:
+        for h in hooks:
+            h.remove()
+
+    return stats
+
+
+def group_norm_with_stats(module, mean, rstd):
+    def forward(x):
+        shape = x.shape
+        h = x.float().reshape(shape[0], module.num_groups, -1)
+        h = ((h - mean[:, :, None]) * rstd[:, :, None]).reshape(shape)
+
+        if module.affine:
+            h = h * module.weight.float()[None, :, None, None] + module.bias.float()[None, :, None, None]
+
+        return h.to(x.dtype)
+
+    return forward
+
+
+@contextlib.contextmanager
+def fixed_group_norm_stats(stats):
+    for module, (mean, rstd) in stats.items():
+        module.forward = group_norm_with_stats(module, mean, rstd)
+
+    try:
+        yield
+    finally:
+        for module in stats:
+            del module.forward
+
+
+def process_tiled(vae, fn, x, scale_in, scale_out):
+    """
+    Applies fn to x tile by tile.
+
+    Tiles are laid out on the latent grid; scale_in and scale_out are sizes of a latent pixel in pixels of x and fn's
+    output: 1 and 8 for decoding, 8 and 1 for encoding.
+    """
+
+    height, width = x.shape[2] // scale_in, x.shape[3] // scale_in
+    tile = max(shared.opts.sd_vae_tiled_tile_size // 8, tile_overlap * 2)
+
+    if height <= tile and width <= tile:
+        return fn(x)
+
+    # GroupNorm layers of the shared VAE are patched below, which would affect a live preview made at the same time
+    shared.state.live_preview_worker.wait()
+
+    # statistics for GroupNorm come from the whole image, downscaled to fit into a single tile
+    downscale = max(1, -(-max(height, width) // tile))
+    small = torch.nn.functional.interpolate(x, size=(height // downscale * scale_in, width // downscale * scale_in), mode="nearest")
+    stats = collect_group_norm_stats(vae, fn, small)
+    del small
+
+    res = None
+    weights = torch.zeros((height * scale_out, width * scale_out), device=x.device, dtype=torch.float32)
+
+    with fixed_group_norm_stats(stats):
+        for y0 in tile_positions(height, tile, tile_overlap):
+            for x0 in tile_positions(width, tile, tile_overlap):
+                y1, x1 = min(y0 + tile, height), min(x0 + tile, width)
+                py0, px0 = max(0, y0 - tile_padding), max(0, x0 - tile_padding)
+                py1, px1 = min(height, y1 + tile_padding), min(width, x1 + tile_padding)
+
+                tile_out = fn(x[:, :, py0 * scale_in:py1 * scale_in, px0 * scale_in:px1 * scale_in])
+                tile_out = tile_out[:, :, (y0 - py0) * scale_out:(y1 - py0) * scale_out, (x0 - px0) * scale_out:(x1 - px0) * scale_out]
+
+                if res is None:
+                    res = torch.zeros((x.shape[0], tile_out.shape[1], height * scale_out, width * scale_out), device=x.device, dtype=torch.float32)
+                    dtype = tile_out.dtype
+
+                w = blend_weights(tile_out.shape[2], tile_out.shape[3], tile_overlap * scale_out, x.device)
+                res[:, :, y0 * scale_out:y1 * scale_out, x0 * scale_out:x1 * scale_out] += tile_out.float() * w
+                weights[y0 * scale_out:y1 * scale_out, x0 * scale_out:x1 * scale_out] += w
+
+    return (res / weights).to(dtype)
+
+
+def decode(model, latent):
+    """latent -> image in [-1, 1]; same as model.decode_first_stage, but done in tiles"""
+
+    return process_tiled(model.first_stage_model, model.decode_first_stage, latent, 1, 8)
+
+
+def encode(model, image):
+    """image in [-1, 1] -> latent; same as model.get_first_stage_encoding(model.encode_first_stage(image)), but done in tiles"""
+
+    vae = model.first_stage_model
+
+    # tiles produce parameters (mean and log variance) of the latent distribution, which are blended, and the latent
+    # is sampled once from the result; blending samples from each tile would average away their noise in overlaps
+    def fn(x):
+        return vae.quant_conv(vae.encoder(x))
+
+    moments = process_tiled(vae, fn, image, 8, 1)
+
+    return model.scale_factor * DiagonalGaussianDistribution(moments).sample()
@@ -57,6 +57,11 @@ options_templates.update(
         {
             "samples_save": OptionInfo(True, "Always save all generated images"),
             "samples_format": OptionInfo("png", "File format for images"),
+            "save_images_in_background": OptionInfo(
+                False, "Save images in background while the next batch is generated"
+            ).info(
+                "decoding and postprocessing still happen before the next batch, so scripts see the same order of callbacks; image saved callbacks run on a separate thread"
+            ),
             "samples_filename_pattern": OptionInfo(
                 "", "Images filename pattern", component_args=hide_dirs
             ).link(
@@ -316,6 +321,20 @@ options_templates.update(
                 False,
                 "Automatically set the Scale by factor based on the name of the selected Upscaler.",
             ),
+            "upscaler_tiles_batch_size": OptionInfo(
+                4,
+                "Maximum number of tiles to upscale at once",
+                gr.Slider,
+                {"minimum": 1, "maximum": 32, "step": 1},
+            ).info("actual number is also limited by estimated free memory"),
+            "upscaler_models_cache_size": OptionInfo(
+                512,
+                "Memory for keeping upscaler models loaded (MB)",
+                gr.Slider,
+                {"minimum": 0, "maximum": 4096, "step": 64},
+            ).info(
+                "loaded models are kept in memory, so they are not read from disk for every image; least recently used are unloaded first; 0 = load model every time"
+            ),
         },
     )
 )
@@ -341,6 +360,12 @@ options_templates.update(
                 gr.Slider,
                 {"minimum": 0, "maximum": 1, "step": 0.01},
             ).info("0 = maximum effect; 1 = minimum effect"),
+            "face_restoration_batch_size": OptionInfo(
+                8,
+                "Maximum number of faces to restore at once",
+                gr.Slider,
+                {"minimum": 1, "maximum": 32, "step": 1},
+            ).info("faces from all images of a batch are restored together; halved automatically when running out of memory"),
             "face_restoration_unload": OptionInfo(
                 False, "Move face restoration model from VRAM into RAM after processing"
             ),
@@ -514,6 +539,19 @@ options_templates.update(
             ).info(
                 "choose Unet model: Automatic = use one with same filename as checkpoint; None = use Unet from checkpoint"
             ),
+            "torch_compile_warmup_shapes": OptionInfo(
+                "", "torch.compile Unet: shapes to compile when model is loaded"
+            ).info(
+                "comma-separated list of WIDTHxHEIGHT or WIDTHxHEIGHTxBATCH, for example: 512x512, 1024x1024x2"
+            ),
+            "torch_compile_max_shapes": OptionInfo(
+                8,
+                "torch.compile Unet: maximum number of compiled shapes",
+                gr.Slider,
+                {"minimum": 1, "maximum": 64, "step": 1},
+            ).info(
+                "every new resolution or batch size requires a recompile; past this number, new shapes run without compilation"
+            ),
             "enable_quantization": OptionInfo(
                 False,
                 "Enable quantization in K samplers for sharper and cleaner results. This may change existing seeds",
@@ -540,6 +578,11 @@ options_templates.update(
             ).info(
                 "in tokens - for texts shorter than specified, if they don't fit into 75 token limit, move them to the next 75 token chunk"
             ),
+            "clip_tokenization_cache_size": OptionInfo(
+                1024, "Number of tokenized prompts to keep in cache", gr.Number, {"precision": 0}
+            ).info(
+                "reused by generation and by the token counter; 0 = disable"
+            ),
             "CLIP_stop_at_last_layers": OptionInfo(
                 1,
                 "Clip skip",
@@ -653,6 +696,28 @@ For img2img, VAE is used to process user's input image before the sampling, and
                 {"choices": ["Full", "TAESD"]},
                 infotext="VAE Decoder",
             ).info("method to decode latent to image"),
+            "sd_vae_decode_batch_size": OptionInfo(
+                8,
+                "Maximum number of images to decode with VAE at once",
+                gr.Slider,
+                {"minimum": 1, "maximum": 64, "step": 1},
+            ).info(
+                "actual number is also limited by estimated free memory, and is halved if decoding runs out of memory; 1 = decode images one by one"
+            ),
+            "sd_vae_tiled_threshold": OptionInfo(
+                0.0,
+                "Use tiled VAE for images larger than (megapixels)",
+                gr.Slider,
+                {"minimum": 0.0, "maximum": 64.0, "step": 0.5},
+            ).info(
+                "encode and decode large images in overlapping tiles to reduce memory use; 0 = never"
+            ),
+            "sd_vae_tiled_tile_size": OptionInfo(
+                1024,
+                "Tiled VAE tile size (pixels)",
+                gr.Slider,
+                {"minimum": 256, "maximum": 4096, "step": 64},
+            ),
         },
     )
 )
@@ -767,6 +832,29 @@ options_templates.update(
             .info(
                 "skip negative prompt for some steps when the image is almost ready; 0=disable, higher=faster"
             ),
+            "cfg_truncation_step": OptionInfo(
+                0.0,
+                "CFG truncation: skip negative prompt after this fraction of steps",
+                gr.Slider,
+                {"minimum": 0.0, "maximum": 1.0, "step": 0.01},
+                infotext="CFG truncation step",
+            ).info(
+                "once skipped, the negative prompt is not used for the rest of sampling; 0=disable, lower=faster"
+            ),
+            "cfg_truncation_sigma": OptionInfo(
+                0.0,
+                "CFG truncation: skip negative prompt below this sigma",
+                gr.Slider,
+                {"minimum": 0.0, "maximum": 15.0, "step": 0.01},
+                infotext="CFG truncation sigma",
+            ).info("0=disable, higher=faster"),
+            "cfg_truncation_tolerance": OptionInfo(
+                0.0,
+                "CFG truncation: skip negative prompt once predictions with and without it differ by less than",
+                gr.Slider,
+                {"minimum": 0.0, "maximum": 1.0, "step": 0.001},
+                infotext="CFG truncation tolerance",
+            ).info("relative difference; 0=disable, higher=faster"),
             "token_merging_ratio": OptionInfo(
                 0.0,
                 "Token merging ratio",
@@ -808,6 +896,9 @@ options_templates.update(
             "batch_cond_uncond": OptionInfo(True, "Batch cond/uncond").info(
                 "do both conditional and unconditional denoising in one batch; uses a bit more VRAM during sampling, but improves speed; previously this was controlled by --always-batch-cond-uncond commandline argument"
             ),
+            "precompute_cond_batch": OptionInfo(True, "Precompute per-step conditioning").info(
+                "build prompt/negative prompt batches for all steps once before sampling instead of on every step; disable if an extension modifies conditioning tensors in place"
+            ),
             "fp8_storage": OptionInfo(
                 "Disable",
                 "FP8 weight",
@@ -819,6 +910,24 @@ options_templates.update(
             "cache_fp16_weight": OptionInfo(False, "Cache FP16 weight for LoRA").info(
                 "Cache fp16 weight when enabling FP8, will increase the quality of LoRA. Use more system ram."
             ),
+            "cpu_optimization": OptionInfo(
+                "None",
+                "CPU optimization",
+                gr.Radio,
+                {"choices": ["None", "Automatic", "int8", "bf16"]},
+            ).info(
+                "only when running on CPU with --no-half; int8 = dynamically quantize Linear layers of Unet and text encoder, LoRA does not work with it; bf16 = convert Unet and text encoder to bfloat16; Automatic = bf16 if CPU supports it, int8 otherwise; applies when a checkpoint is loaded"
+            ),
+            "cpu_optimization_cache": OptionInfo(True, "Save quantized CPU model next to the checkpoint").info(
+                "int8 weights are stored in a .cpu-int8.cache file, so they do not have to be computed again"
+            ),
+            "cpu_channels_last": OptionInfo(False, "Use channels_last memory format for Unet on CPU"),
+            "cpu_threads": OptionInfo(
+                0,
+                "Number of threads for CPU inference",
+                gr.Slider,
+                {"minimum": 0, "maximum": os.cpu_count() or 64, "step": 1},
+            ).info("0 = PyTorch default"),
         },
     )
 )
@@ -973,6 +1082,34 @@ options_templates.update(
                 gr.Slider,
                 {"minimum": 0.0, "maximum": 2.0, "step": 0.01},
             ).info("1 = original size"),
+            "extra_networks_cards_per_page": OptionInfo(
+                0, "Number of Extra Networks cards loaded at once", gr.Number, {"precision": 0}
+            ).info(
+                "0 = render all cards when the page is opened; otherwise cards are requested from the server in pages of this size while scrolling"
+            ).needs_reload_ui(),
+            "extra_networks_thumbnail_size": OptionInfo(
+                0, "Size of Extra Networks card preview thumbnails", gr.Number, {"precision": 0}
+            ).info(
+                "in pixels; 0 = send full-size preview images; larger previews are downscaled and stored in the thumbnail cache"
+            ),
+            "extra_networks_thumbnail_format": OptionInfo(
+                "WEBP",
+                "Format of Extra Networks card preview thumbnails",
+                gr.Radio,
+                {"choices": ["WEBP", "JPEG"]},
+            ),
+            "extra_networks_thumbnail_quality": OptionInfo(
+                85,
+                "Quality of Extra Networks card preview thumbnails",
+                gr.Slider,
+                {"minimum": 1, "maximum": 100, "step": 1},
+            ),
+            "extra_networks_thumbnail_cache_size": OptionInfo(
+                512, "Size limit of the thumbnail cache", gr.Number
+            ).info("in MB; least recently used thumbnails are removed when it is exceeded"),
+            "extra_networks_thumbnail_pregenerate": OptionInfo(
+                False, "Create thumbnails in background when Extra Networks pages are opened"
+            ),
             "extra_networks_card_show_desc": OptionInfo(
                 True, "Show description on card"
             ),
@@ -1016,9 +1153,23 @@ options_templates.update(
             "textual_inversion_print_at_load": OptionInfo(
                 False, "Print a list of Textual Inversion embeddings when loading model"
             ),
+            "textual_inversion_load_threads": OptionInfo(
+                4,
+                "Number of threads used to read Textual Inversion embedding files",
+                gr.Slider,
+                {"minimum": 1, "maximum": 32, "step": 1},
+            ),
+            "textual_inversion_cache_decoded": OptionInfo(
+                True, "Cache decoded Textual Inversion embeddings on disk"
+            ).info("embeddings stored in .pt, .bin and image files are decoded again only when the file changes"),
             "textual_inversion_add_hashes_to_infotext": OptionInfo(
                 True, "Add Textual Inversion hashes to infotext"
             ),
+            "hypernetwork_cache_context": OptionInfo(
+                False, "Cache hypernetwork outputs for conditioning"
+            ).info(
+                "runs stacked hypernetworks once per conditioning instead of in every cross-attention layer on every step; results may differ slightly in half precision"
+            ),
             "sd_hypernetwork": OptionInfo(
                 "None",
                 "Add hypernetwork to prompt",
@@ -1330,6 +1481,14 @@ options_templates.update(
             ).info(
                 "Full = slow but pretty; Approx NN and TAESD = fast but low quality; Approx cheap = super fast but terrible otherwise"
             ),
+            "live_previews_async": OptionInfo(
+                False, "Create live previews in background"
+            ).info(
+                "sampling does not wait for the preview to be created; if a preview is requested before the previous one is done, the previous one is skipped"
+            ),
+            "live_preview_cheap_under_load": OptionInfo(
+                False, "Use Approx cheap live preview method while previews fall behind"
+            ),
             "live_preview_allow_lowvram_full": OptionInfo(
                 False, "Allow Full live preview method with lowvram/medvram"
             ).info(
@@ -1525,6 +1684,24 @@ options_templates.update(
                 gr.Slider,
                 {"minimum": 0, "maximum": 10, "step": 1},
             ),
+            "upscaling_cache_size": OptionInfo(
+                512,
+                "Maximum memory for images in upscaling cache (MB)",
+                gr.Slider,
+                {"minimum": 0, "maximum": 8192, "step": 64},
+            ).info("cache is shared by extras, API and hires fix"),
+            "postprocessing_batch_prefetch": OptionInfo(
+                4,
+                "Number of images to read ahead when processing a directory in extras tab",
+                gr.Slider,
+                {"minimum": 0, "maximum": 16, "step": 1},
+            ).info("also limits the number of images waiting to be saved; 0 = read each image when it is needed"),
+            "postprocessing_batch_save_in_background": OptionInfo(
+                False, "Save images in background when processing a directory in extras tab"
+            ).info("image saved callbacks run on a separate thread"),
+            "postprocessing_batch_skip_existing": OptionInfo(
+                False, "Skip images that already have output when processing a directory in extras tab"
+            ).info("for resuming an interrupted batch; finished images are recorded in a .extras-batch-finished file in the output directory"),
             "postprocessing_existing_caption_action": OptionInfo(
                 "Ignore",
                 "Action for existing captions",
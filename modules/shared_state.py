@@ -3,6 +3,8 @@ import logging
 import threading
 import time
 
+import torch
+
 from modules import errors, shared, devices
 from typing import Optional
 
@@ -32,6 +34,7 @@ class State:
 
     def __init__(self):
         self.server_start = time.time()
+        self.live_preview_worker = LivePreviewWorker(self)
 
     @property
     def need_restart(self) -> bool:
@@ -86,7 +89,7 @@ class State:
 
     def nextjob(self):
         if shared.opts.live_previews_enable and shared.opts.show_progress_every_n_steps == -1:
-            self.do_set_current_image()
+            self.queue_current_image()
 
         self.job_no += 1
         self.sampling_step = 0
@@ -140,20 +143,28 @@ class State:
             return
 
         if self.sampling_step - self.current_image_sampling_step >= shared.opts.show_progress_every_n_steps and shared.opts.live_previews_enable and shared.opts.show_progress_every_n_steps != -1:
+            self.queue_current_image()
+
+    def queue_current_image(self):
+        """creates an image from self.current_latent in background if enabled in settings, or right away otherwise"""
+
+        if not shared.opts.live_previews_async:
             self.do_set_current_image()
+            return
 
-    def do_set_current_image(self):
         if self.current_latent is None:
             return
 
-        import modules.sd_samplers
+        # sampler can modify the latent in place while the preview is being made
+        self.live_preview_worker.queue(self.current_latent.detach().clone(), self.job_timestamp)
+        self.current_image_sampling_step = self.sampling_step
 
-        try:
-            if shared.opts.show_progress_grid:
-                self.assign_current_image(modules.sd_samplers.samples_to_image_grid(self.current_latent))
-            else:
-                self.assign_current_image(modules.sd_samplers.sample_to_image(self.current_latent))
+    def do_set_current_image(self):
+        if self.current_latent is None:
+            return
 
+        try:
+            self.assign_current_image(create_preview_image(self.current_latent))
             self.current_image_sampling_step = self.sampling_step
 
         except Exception:
@@ -166,3 +177,92 @@ class State:
             image = image.convert('RGB')
         self.current_image = image
         self.id_live_preview += 1
+
+
+def create_preview_image(latent, approximation=None):
+    import modules.sd_samplers
+
+    if shared.opts.show_progress_grid:
+        return modules.sd_samplers.samples_to_image_grid(latent, approximation)
+
+    return modules.sd_samplers.sample_to_image(latent, approximation=approximation)
+
+
+class LivePreviewWorker:
+    """
+    Creates live preview images on a separate thread, so that sampling does not wait for them.
+
+    Only the latest requested latent is kept; if a new one arrives before the previous one is rendered, the previous
+    one is dropped. While requests arrive faster than previews are made, the cheapest preview method is used if
+    enabled in settings.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.condition = threading.Condition()
+        self.pending = None
+        self.busy = False
+        self.under_load = False
+        self.thread = None
+
+    def queue(self, latent, job_timestamp):
+        with self.condition:
+            if self.busy or self.pending is not None:
+                self.under_load = True
+
+            self.pending = (latent, job_timestamp)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="live_preview", daemon=True)
+                self.thread.start()
+
+            self.condition.notify_all()
+
+    def wait(self):
+        """
+        Drops the pending request and waits for the preview being made to finish. Called before VAE is used for actual
+        output, so that the preview thread does not use VAE at the same time.
+        """
+
+        if threading.current_thread() is self.thread:
+            return
+
+        with self.condition:
+            self.pending = None
+            while self.busy:
+                self.condition.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+
+                latent, job_timestamp = self.pending
+                self.pending = None
+                self.busy = True
+                cheap = self.under_load and shared.opts.live_preview_cheap_under_load
+
+            try:
+                import modules.sd_samplers_common
+
+                approximation = modules.sd_samplers_common.approximation_indexes["Approx cheap"] if cheap else None
+
+                # grad mode is per thread, so torch.no_grad() of the sampling thread does not apply here
+                with torch.no_grad():
+                    image = create_preview_image(latent, approximation)
+
+                # a preview from a previous job could finish after the next one started
+                if job_timestamp == self.state.job_timestamp:
+                    self.state.assign_current_image(image)
+            except Exception:
+                # when switching models during generation, VAE would be on CPU, so creating an image will fail.
+                # we silently ignore this error
+                errors.record_exception()
+            finally:
+                with self.condition:
+                    self.busy = False
+                    if self.pending is None:
+                        self.under_load = False
+
+                    self.condition.notify_all()
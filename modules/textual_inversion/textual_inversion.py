@@ -1,5 +1,6 @@
 import os
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 
 import torch
@@ -22,6 +23,7 @@ from modules import (
     sd_hijack_checkpoint,
     errors,
     hashes,
+    cache,
 )
 import modules.textual_inversion.dataset
 from modules.textual_inversion.learn_schedule import LearnRateScheduler
@@ -132,6 +134,10 @@ class EmbeddingDatabase:
         self.expected_shape = -1
         self.embedding_dirs = {}
         self.previously_displayed_embeddings = ()
+        self.loaded_files = {}
+        """maps full path of a file to (stat key, Embedding or None if the file is not an embedding)"""
+        self.version = 0
+        """incremented every time the set of registered embeddings changes; used to invalidate cached tokenization results"""
 
     def add_embedding_dir(self, path):
         self.embedding_dirs[path] = DirWithTextualInversionEmbeddings(path)
@@ -143,6 +149,8 @@ class EmbeddingDatabase:
         return self.register_embedding_by_name(embedding, model, embedding.name)
 
     def register_embedding_by_name(self, embedding, model, name):
+        self.version += 1
+
         ids = model.cond_stage_model.tokenize([name])[0]
         first_id = ids[0]
         if first_id not in self.ids_lookup:
@@ -173,58 +181,82 @@ class EmbeddingDatabase:
         return vec.shape[1]
 
     def load_from_file(self, path, filename):
-        name, ext = os.path.splitext(filename)
-        ext = ext.upper()
-
-        if ext in [".PNG", ".WEBP", ".JXL", ".AVIF"]:
-            _, second_ext = os.path.splitext(name)
-            if second_ext.upper() == ".PREVIEW":
-                return
-
-            embed_image = Image.open(path)
-            if hasattr(embed_image, "text") and "sd-ti-embedding" in embed_image.text:
-                data = embedding_from_b64(embed_image.text["sd-ti-embedding"])
-                name = data.get("name", name)
-            else:
-                data = extract_image_data_embed(embed_image)
-                if data:
-                    name = data.get("name", name)
-                else:
-                    # if data is None, means this is not an embedding, just a preview image
-                    return
-        elif ext in [".BIN", ".PT"]:
-            data = torch.load(path, map_location="cpu")
-        elif ext in [".SAFETENSORS"]:
-            data = safetensors.torch.load_file(path, device="cpu")
-        else:
+        embedding = read_embedding_file(path, filename)
+        if embedding is None:
             return
 
-        embedding = create_embedding_from_data(
-            data, name, filename=filename, filepath=path
-        )
+        self.register_loaded_embedding(embedding)
 
+    def register_loaded_embedding(self, embedding):
         if self.expected_shape == -1 or self.expected_shape == embedding.shape:
             self.register_embedding(embedding, shared.sd_model)
         else:
-            self.skipped_embeddings[name] = embedding
+            self.skipped_embeddings[embedding.name] = embedding
 
-    def load_from_dir(self, embdir):
+    def list_files_in_dir(self, embdir):
+        """Returns a list of (fullpath, filename, stat) for files in the embeddings directory that may contain embeddings."""
         if not os.path.isdir(embdir.path):
-            return
+            return []
 
+        res = []
         for root, _, fns in os.walk(embdir.path, followlinks=True):
             for fn in fns:
-                try:
-                    fullfn = os.path.join(root, fn)
+                fullfn = os.path.join(root, fn)
 
-                    if os.stat(fullfn).st_size == 0:
-                        continue
+                try:
+                    stat = os.stat(fullfn)
+                except OSError:
+                    continue
 
-                    self.load_from_file(fullfn, fn)
-                except Exception:
-                    errors.report(f"Error loading embedding {fn}", exc_info=True)
+                if stat.st_size == 0:
                     continue
 
+                res.append((fullfn, fn, stat))
+
+        return res
+
+    def load_from_dir(self, embdir):
+        self.load_files(self.list_files_in_dir(embdir))
+
+    def load_files(self, files):
+        """Loads embeddings from files, reusing embeddings from previous loads for files that have not changed.
+
+        Changed files are read in a thread pool; registration happens afterwards in the original order,
+        so that which of the embeddings with the same name wins does not depend on thread timing.
+        """
+
+        def read(fullfn, fn, stat):
+            try:
+                return stat_key(stat), read_embedding_file(fullfn, fn)
+            except Exception:
+                errors.report(f"Error loading embedding {fn}", exc_info=True)
+                return None
+
+        pending = {}
+        threads = max(1, int(shared.opts.textual_inversion_load_threads))
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="textual_inversion_load") as executor:
+            for fullfn, fn, stat in files:
+                loaded = self.loaded_files.get(fullfn)
+                if loaded is None or loaded[0] != stat_key(stat):
+                    pending[fullfn] = executor.submit(read, fullfn, fn, stat)
+
+            for fullfn, future in pending.items():
+                result = future.result()
+                if result is None:
+                    self.loaded_files.pop(fullfn, None)
+                else:
+                    self.loaded_files[fullfn] = result
+
+        for fullfn, fn, _ in files:
+            loaded = self.loaded_files.get(fullfn)
+            if loaded is None or loaded[1] is None:
+                continue
+
+            try:
+                self.register_loaded_embedding(loaded[1])
+            except Exception:
+                errors.report(f"Error loading embedding {fn}", exc_info=True)
+
     def load_textual_inversion_embeddings(self, force_reload=False):
         if not force_reload:
             need_reload = False
@@ -239,12 +271,21 @@ class EmbeddingDatabase:
         self.ids_lookup.clear()
         self.word_embeddings.clear()
         self.skipped_embeddings.clear()
+        self.version += 1
         self.expected_shape = self.get_expected_shape()
 
+        files = []
         for embdir in self.embedding_dirs.values():
-            self.load_from_dir(embdir)
+            files += self.list_files_in_dir(embdir)
             embdir.update()
 
+        # forget embeddings from files that no longer exist
+        existing = {fullfn for fullfn, _, _ in files}
+        for fullfn in [x for x in self.loaded_files if x not in existing]:
+            del self.loaded_files[fullfn]
+
+        self.load_files(files)
+
         # re-sort word_embeddings because load_from_dir may not load in alphabetic order.
         # using a temporary copy so we don't reinitialize self.word_embeddings in case other objects have a reference to it.
         sorted_word_embeddings = {
@@ -285,6 +326,105 @@ class EmbeddingDatabase:
         return None, None
 
 
+def stat_key(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_embedding_data(path, filename):
+    """Reads an embedding file; returns a tuple of (name, data), or None if the file does not contain an embedding."""
+
+    name, ext = os.path.splitext(filename)
+    ext = ext.upper()
+
+    if ext in [".PNG", ".WEBP", ".JXL", ".AVIF"]:
+        _, second_ext = os.path.splitext(name)
+        if second_ext.upper() == ".PREVIEW":
+            return None
+
+        embed_image = Image.open(path)
+        if hasattr(embed_image, "text") and "sd-ti-embedding" in embed_image.text:
+            data = embedding_from_b64(embed_image.text["sd-ti-embedding"])
+            name = data.get("name", name)
+        else:
+            data = extract_image_data_embed(embed_image)
+            if data:
+                name = data.get("name", name)
+            else:
+                # if data is None, means this is not an embedding, just a preview image
+                return None
+    elif ext in [".BIN", ".PT"]:
+        data = torch.load(path, map_location="cpu")
+    elif ext in [".SAFETENSORS"]:
+        data = safetensors.torch.load_file(path, device="cpu")
+    else:
+        return None
+
+    return name, data
+
+
+def embedding_to_cache(embedding):
+    """Converts an embedding into a picklable dict for the on-disk cache; tensors are stored as safetensors bytes."""
+
+    tensors = embedding.vec if isinstance(embedding.vec, dict) else {"vec": embedding.vec}
+
+    return {
+        "name": embedding.name,
+        "tensors": safetensors.torch.save({k: v.detach().cpu().contiguous() for k, v in tensors.items()}),
+        "is_dict": isinstance(embedding.vec, dict),
+        "step": embedding.step,
+        "sd_checkpoint": embedding.sd_checkpoint,
+        "sd_checkpoint_name": embedding.sd_checkpoint_name,
+        "vectors": embedding.vectors,
+        "shape": embedding.shape,
+    }
+
+
+def embedding_from_cache(entry, filepath):
+    tensors = {k: v.to(devices.device, dtype=torch.float32) for k, v in safetensors.torch.load(entry["tensors"]).items()}
+
+    embedding = Embedding(tensors if entry["is_dict"] else tensors["vec"], entry["name"])
+    embedding.step = entry["step"]
+    embedding.sd_checkpoint = entry["sd_checkpoint"]
+    embedding.sd_checkpoint_name = entry["sd_checkpoint_name"]
+    embedding.vectors = entry["vectors"]
+    embedding.shape = entry["shape"]
+    embedding.filename = filepath
+    embedding.set_hash(hashes.sha256(filepath, "textual_inversion/" + embedding.name) or "")
+
+    return embedding
+
+
+def read_embedding_file(path, filename):
+    """Reads an embedding file and returns an Embedding, or None if the file is not an embedding.
+
+    Decoded vectors of files other than safetensors (which load fast as they are) are kept in the on-disk
+    cache keyed by file's mtime, so that pickles and images do not have to be decoded again after a restart.
+    Safe to call from multiple threads.
+    """
+
+    if not shared.opts.textual_inversion_cache_decoded or filename.upper().endswith(".SAFETENSORS"):
+        res = read_embedding_data(path, filename)
+        if res is None:
+            return None
+
+        name, data = res
+        return create_embedding_from_data(data, name, filename=filename, filepath=path)
+
+    def read():
+        res = read_embedding_data(path, filename)
+        if res is None:
+            return {"name": None}
+
+        name, data = res
+        return embedding_to_cache(create_embedding_from_data(data, name, filename=filename, filepath=path))
+
+    entry = cache.cached_data_for_file("textual_inversion_embeddings", path, path, read)
+    if entry is None or entry["name"] is None:
+        return None
+
+    return embedding_from_cache(entry, path)
+
+
 def create_embedding(name, num_vectors_per_token, overwrite_old, init_text="*"):
     cond_model = shared.sd_model.cond_stage_model
 
@@ -1,5 +1,6 @@
 import functools
 import os.path
+import threading
 import urllib.parse
 from base64 import b64decode
 from io import BytesIO
@@ -7,11 +8,12 @@ from pathlib import Path
 from typing import Optional, Union
 from dataclasses import dataclass
 
-from modules import shared, ui_extra_networks_user_metadata, errors, extra_networks, util
+from modules import shared, ui_extra_networks_user_metadata, ui_extra_networks_thumbnails, errors, extra_networks, util
 from modules.images import read_info_from_image, save_image_with_geninfo
 import gradio as gr
 import json
 import html
+from fastapi import Request
 from fastapi.exceptions import HTTPException
 from PIL import Image
 
@@ -21,6 +23,14 @@ extra_pages = []
 allowed_dirs = set()
 default_allowed_preview_extensions = ["png", "jpg", "jpeg", "webp", "gif"]
 
+default_sort_keys = {
+    "Path": "default",
+    "Name": "name",
+    "Date Created": "date_created",
+    "Date Modified": "date_modified",
+}
+"""sort keys used by the browser for each value of the extra_networks_card_order_field setting"""
+
 @functools.cache
 def allowed_preview_extensions_with_extra(extra_extensions=None):
     return set(default_allowed_preview_extensions) | set(extra_extensions or [])
@@ -94,8 +104,8 @@ def register_page(page):
     allowed_dirs.update(set(sum([x.allowed_directories_for_previews() for x in extra_pages], [])))
 
 
-def fetch_file(filename: str = ""):
-    from starlette.responses import FileResponse
+def fetch_file(request: Request, filename: str = ""):
+    from starlette.responses import FileResponse, Response
 
     if not os.path.isfile(filename):
         raise HTTPException(status_code=404, detail="File not found")
@@ -107,8 +117,22 @@ def fetch_file(filename: str = ""):
     if ext not in allowed_preview_extensions():
         raise ValueError(f"File cannot be fetched: {filename}. Extensions allowed: {allowed_preview_extensions()}.")
 
-    # would profit from returning 304
-    return FileResponse(filename, headers={"Accept-Ranges": "bytes"})
+    if ui_extra_networks_thumbnails.enabled():
+        try:
+            response = ui_extra_networks_thumbnails.thumbnail_response(filename, request)
+            if response is not None:
+                return response
+        except Exception as e:
+            errors.display_once(e, f"creating thumbnail for {filename}")
+
+    # with stat_result, FileResponse sets its ETag header right away rather than when it is sent
+    response = FileResponse(filename, headers={"Accept-Ranges": "bytes"}, stat_result=os.stat(filename))
+    etag = response.headers.get("etag")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag is not None and if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return response
 
 
 def fetch_cover_images(page: str = "", item: str = "", index: int = 0):
@@ -165,16 +189,54 @@ def get_single_card(page: str = "", tabname: str = "", name: str = ""):
         item = page.items.get(name)
 
     page.read_user_metadata(item, use_cache=False)
+    page.items_without_preview.discard(name)
+    page.items_without_description.discard(name)
     item_html = page.create_item_html(tabname, item, shared.html("extra-networks-card.html"))
 
     return JSONResponse({"html": item_html})
 
 
+def get_cards(page: str = "", tabname: str = "", search: str = "", sort: str = "default", sortdir: str = "Ascending", offset: int = 0, limit: int = 0):
+    """Returns HTML for a single page of cards, searched and sorted on the server using the page's in-memory index."""
+    from starlette.responses import JSONResponse
+
+    page = next(iter([x for x in extra_pages if x.name == page]), None)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    items = page.query_items(search=search, sort=sort, sortdir=sortdir)
+
+    offset = max(int(offset), 0)
+    limit = int(limit) if limit else shared.opts.extra_networks_cards_per_page
+    if limit <= 0:
+        limit = len(items)
+
+    cards = []
+    for item in items[offset:offset + limit]:
+        page.ensure_item_details(item)
+        cards.append(page.create_item_html(tabname, item, page.card_tpl))
+
+    return JSONResponse({"total": len(items), "offset": offset, "html": cards})
+
+
+def get_tree_html(page: str = "", tabname: str = ""):
+    """Returns HTML for the tree or directories view of a page, which paginated pages do not include in their HTML."""
+    from starlette.responses import JSONResponse
+
+    page = next(iter([x for x in extra_pages if x.name == page]), None)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    return JSONResponse({"html": page.create_tree_html(tabname)})
+
+
 def add_pages_to_demo(app):
     app.add_api_route("/sd_extra_networks/thumb", fetch_file, methods=["GET"])
     app.add_api_route("/sd_extra_networks/cover-images", fetch_cover_images, methods=["GET"])
     app.add_api_route("/sd_extra_networks/metadata", get_metadata, methods=["GET"])
     app.add_api_route("/sd_extra_networks/get-single-card", get_single_card, methods=["GET"])
+    app.add_api_route("/sd_extra_networks/cards", get_cards, methods=["GET"])
+    app.add_api_route("/sd_extra_networks/tree", get_tree_html, methods=["GET"])
 
 
 def quote_js(s):
@@ -193,6 +255,12 @@ class ExtraNetworksPage:
         self.allow_negative_prompt = False
         self.metadata = {}
         self.items = {}
+        self.search_index = {}
+        self.items_without_preview = set()
+        self.items_without_description = set()
+        """names of items for which preview or description have not been read from disk yet; see ensure_item_details"""
+
+        self.deferred_details = threading.local()
         self.lister = util.MassFileLister()
         # HTML Templates
         self.pane_tpl = shared.html("extra-networks-pane.html")
@@ -207,6 +275,47 @@ class ExtraNetworksPage:
     def refresh(self):
         pass
 
+    def is_deferring_details(self):
+        """Returns True while items are being listed for a paginated page, in which case previews and descriptions
+        are not looked up; they are read later for items whose cards are requested, see ensure_item_details."""
+        return getattr(self.deferred_details, "active", False)
+
+    def is_paginated(self):
+        return shared.opts.extra_networks_cards_per_page > 0
+
+    def read_item_description(self, item):
+        path, _ = os.path.splitext(item["filename"])
+        item["description"] = self.find_description(path)
+
+        if "user_metadata" not in item:
+            self.read_user_metadata(item)
+        else:
+            desc = item["user_metadata"].get("description", None)
+            if desc is not None:
+                item["description"] = desc
+
+    def read_item_preview(self, item):
+        path, _ = os.path.splitext(item["filename"])
+        item["preview"] = self.find_preview(path)
+
+    def ensure_item_description(self, item):
+        """Reads description and user metadata for an item if they were deferred when the page was created."""
+        name = item["name"]
+
+        if name in self.items_without_description:
+            self.items_without_description.discard(name)
+            self.read_item_description(item)
+
+    def ensure_item_details(self, item):
+        """Reads preview, description and user metadata for an item if they were deferred when the page was created."""
+        name = item["name"]
+
+        self.ensure_item_description(item)
+
+        if name in self.items_without_preview:
+            self.items_without_preview.discard(name)
+            self.read_item_preview(item)
+
     def read_user_metadata(self, item, use_cache=True):
         filename = item.get("filename", None)
         metadata = extra_networks.get_user_metadata(filename, lister=self.lister if use_cache else None)
@@ -220,7 +329,13 @@ class ExtraNetworksPage:
     def link_preview(self, filename):
         quoted_filename = urllib.parse.quote(filename.replace('\\', '/'))
         mtime, _ = self.lister.mctime(filename)
-        return f"./sd_extra_networks/thumb?filename={quoted_filename}&mtime={mtime}"
+        link = f"./sd_extra_networks/thumb?filename={quoted_filename}&mtime={mtime}"
+
+        if ui_extra_networks_thumbnails.enabled():
+            ui_extra_networks_thumbnails.queue_thumbnail(filename)
+            link += f"&size={shared.opts.extra_networks_thumbnail_size}&format={shared.opts.extra_networks_thumbnail_format.lower()}"
+
+        return link
 
     def search_terms_from_path(self, filename, possible_directories=None):
         abspath = os.path.abspath(filename)
@@ -231,6 +346,22 @@ class ExtraNetworksPage:
 
         return ""
 
+    def is_search_only(self, item: dict) -> bool:
+        """Returns True if the item must not be shown in the default view, and must instead only be
+        shown when searching for it (models in hidden directories)."""
+        if shared.opts.extra_networks_hidden_models == "Always":
+            return False
+
+        local_path = ""
+        filename = item.get("filename", "")
+        for reldir in self.allowed_directories_for_previews():
+            absdir = os.path.abspath(reldir)
+
+            if filename.startswith(absdir):
+                local_path = filename[len(absdir):]
+
+        return "/." in local_path or "\\." in local_path
+
     def create_item_html(
         self,
         tabname: str,
@@ -286,21 +417,7 @@ class ExtraNetworksPage:
             }
         )
 
-        local_path = ""
-        filename = item.get("filename", "")
-        for reldir in self.allowed_directories_for_previews():
-            absdir = os.path.abspath(reldir)
-
-            if filename.startswith(absdir):
-                local_path = filename[len(absdir):]
-
-        # if this is true, the item must not be shown in the default view, and must instead only be
-        # shown when searching for it
-        if shared.opts.extra_networks_hidden_models == "Always":
-            search_only = False
-        else:
-            search_only = "/." in local_path or "\\." in local_path
-
+        search_only = self.is_search_only(item)
         if search_only and shared.opts.extra_networks_hidden_models == "Never":
             return ""
 
@@ -563,8 +680,22 @@ class ExtraNetworksPage:
             HTML formatted string.
         """
         res = []
-        for item in self.items.values():
-            res.append(self.create_item_html(tabname, item, self.card_tpl))
+        if self.items and self.is_paginated():
+            # only the first page of cards is included; the rest are requested from /sd_extra_networks/cards by the
+            # browser as the user scrolls
+            sort = default_sort_keys.get(shared.opts.extra_networks_card_order_field, "default")
+            sortdir = shared.opts.extra_networks_card_order
+            for item in self.query_items(sort=sort, sortdir=sortdir)[:shared.opts.extra_networks_cards_per_page]:
+                self.ensure_item_details(item)
+                res.append(self.create_item_html(tabname, item, self.card_tpl))
+
+            res.append(
+                f"<div class='extra-network-cards-sentinel' data-page='{html.escape(self.name)}' data-page-size='{shared.opts.extra_networks_cards_per_page}'"
+                f" data-offset='{len(res)}' data-sort='{sort}' data-sortdir='{html.escape(sortdir)}'></div>"
+            )
+        else:
+            for item in self.items.values():
+                res.append(self.create_item_html(tabname, item, self.card_tpl))
 
         if not res:
             dirs = "".join([f"<li>{x}</li>" for x in self.allowed_directories_for_previews()])
@@ -587,8 +718,17 @@ class ExtraNetworksPage:
         self.lister.reset()
         self.metadata = {}
 
-        items_list = [] if empty else self.list_items()
+        paginated = self.is_paginated()
+
+        self.deferred_details.active = paginated
+        try:
+            items_list = [] if empty else list(self.list_items())
+        finally:
+            self.deferred_details.active = False
+
         self.items = {x["name"]: x for x in items_list}
+        self.items_without_preview = set(self.items) if paginated else set()
+        self.items_without_description = set(self.items) if paginated else set()
 
         # Populate the instance metadata for each item.
         for item in self.items.values():
@@ -596,9 +736,11 @@ class ExtraNetworksPage:
             if metadata:
                 self.metadata[item["name"]] = metadata
 
-            if "user_metadata" not in item:
+            if not paginated and "user_metadata" not in item:
                 self.read_user_metadata(item)
 
+        self.build_search_index()
+
         show_tree = shared.opts.extra_networks_tree_view_default_enabled
 
         page_params = {
@@ -615,13 +757,94 @@ class ExtraNetworksPage:
             "tree_view_div_default_display_class": "" if show_tree else "extra-network-dirs-hidden",
         }
 
+        if paginated and self.items:
+            # the browser requests the tree from /sd_extra_networks/tree when it is shown
+            tree_html = f"<div class='extra-network-tree-placeholder' data-page='{html.escape(self.name)}'></div>"
+        else:
+            tree_html = self.create_tree_html(tabname)
+
         if shared.opts.extra_networks_tree_view_style == "Tree":
-            pane_content = self.pane_content_tree_tpl.format(**page_params, tree_html=self.create_tree_view_html(tabname))
+            pane_content = self.pane_content_tree_tpl.format(**page_params, tree_html=tree_html)
         else:
-            pane_content = self.pane_content_dirs_tpl.format(**page_params, dirs_html=self.create_dirs_view_html(tabname))
+            pane_content = self.pane_content_dirs_tpl.format(**page_params, dirs_html=tree_html)
 
         return self.pane_tpl.format(**page_params, pane_content=pane_content)
 
+    def create_tree_html(self, tabname):
+        """Generates HTML for the tree view or the directories view, depending on settings."""
+
+        if shared.opts.extra_networks_tree_view_style == "Tree":
+            # entries in the tree use the prompt, which for some pages depends on user metadata
+            for item in list(self.items.values()):
+                self.ensure_item_description(item)
+
+            return self.create_tree_view_html(tabname)
+        else:
+            return self.create_dirs_view_html(tabname)
+
+    def search_text(self, item):
+        description = item.get("description", "") or "" if shared.opts.extra_networks_card_show_desc else ""
+        return " ".join([str(x) for x in item.get("search_terms", [])] + [description]).lower()
+
+    def build_search_index(self):
+        """Builds the in-memory index used by query_items to search and sort cards without touching the filesystem."""
+        index = {}
+        for name, item in self.items.items():
+            search_only = self.is_search_only(item)
+            if search_only and shared.opts.extra_networks_hidden_models == "Never":
+                continue
+
+            index[name] = (self.search_text(item), search_only)
+
+        self.search_index = index
+
+    def query_items(self, search: str = "", sort: str = "default", sortdir: str = "Ascending") -> list[dict]:
+        """Returns items matching the search string, ordered the same way the cards are ordered in the browser.
+
+        Args:
+            search: Search string; an item matches if it is a substring of its search terms or description.
+            sort: Name of the sort key from item's `sort_keys`.
+            sortdir: Either "Ascending" or "Descending".
+
+        Returns:
+            List of item dictionaries.
+        """
+        search = search.lower()
+
+        # descriptions are searched too, so they have to be read for all items once something is searched for
+        if search and self.items_without_description:
+            for name in list(self.items_without_description):
+                item = self.items.get(name)
+                if item is None:
+                    self.items_without_description.discard(name)
+                    continue
+
+                self.ensure_item_description(item)
+                if name in self.search_index:
+                    self.search_index[name] = (self.search_text(item), self.search_index[name][1])
+
+        res = []
+        for name, (text, search_only) in list(self.search_index.items()):
+            if search_only and len(search) < 4:
+                continue
+
+            if search not in text:
+                continue
+
+            item = self.items.get(name)
+            if item is not None:
+                res.append(item)
+
+        def sort_key(item):
+            value = item.get("sort_keys", {}).get(sort)
+            if isinstance(value, (int, float)):
+                return 0, value, ""
+
+            return 1, 0, str(value) if value is not None else ""
+
+        res.sort(key=sort_key, reverse=sortdir == "Descending")
+        return res
+
     def create_item(self, name, index=None):
         raise NotImplementedError()
 
@@ -649,6 +872,9 @@ class ExtraNetworksPage:
         Find a preview PNG for a given path (without extension) and call link_preview on it.
         """
 
+        if self.is_deferring_details():
+            return None
+
         potential_files = sum([[f"{path}.{ext}", f"{path}.preview.{ext}"] for ext in allowed_preview_extensions()], [])
 
         for file in potential_files:
@@ -662,6 +888,9 @@ class ExtraNetworksPage:
         Find if embedded preview exists in safetensors metadata and return endpoint for it.
         """
 
+        if self.is_deferring_details():
+            return None
+
         file = f"{path}.safetensors"
         if self.lister.exists(file) and 'ssmd_cover_images' in metadata and len(list(filter(None, json.loads(metadata['ssmd_cover_images'])))) > 0:
             return f"./sd_extra_networks/cover-images?page={self.extra_networks_tabname}&item={name}"
@@ -672,6 +901,10 @@ class ExtraNetworksPage:
         """
         Find and read a description file for a given path (without extension).
         """
+
+        if self.is_deferring_details():
+            return None
+
         for file in [f"{path}.txt", f"{path}.description.txt"]:
             if not self.lister.exists(file):
                 continue
@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import diskcache
+from PIL import Image
+
+from modules import shared, errors, images
+from modules.cache import cache_dir
+
+thumbnail_formats = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+}
+
+thumbnails_cache = None
+thumbnails_lock = threading.Lock()
+background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extra_networks_thumbnails")
+background_queued = set()
+
+
+def enabled():
+    return shared.opts.extra_networks_thumbnail_size > 0
+
+
+def get_cache() -> diskcache.Cache:
+    """Returns the on-disk cache for thumbnails; it has its own size limit so that it does not evict other caches' data."""
+
+    global thumbnails_cache
+
+    size_limit = int(shared.opts.extra_networks_thumbnail_cache_size * 1024 * 1024)
+
+    with thumbnails_lock:
+        if thumbnails_cache is None:
+            thumbnails_cache = diskcache.Cache(
+                os.path.join(cache_dir, "extra-networks-thumbnails"),
+                size_limit=size_limit,
+                eviction_policy="least-recently-used",
+            )
+        elif thumbnails_cache.size_limit != size_limit:
+            thumbnails_cache.reset("size_limit", size_limit)
+
+    return thumbnails_cache
+
+
+def thumbnail_key(filename):
+    """Returns the key for a thumbnail of the file, which changes whenever the file or thumbnail settings change."""
+
+    stat = os.stat(filename)
+    return f"{os.path.abspath(filename)}:{stat.st_mtime_ns}:{stat.st_size}:{shared.opts.extra_networks_thumbnail_size}:{shared.opts.extra_networks_thumbnail_format}"
+
+
+def etag_for_key(key):
+    return '"' + hashlib.sha1(key.encode("utf8")).hexdigest() + '"'
+
+
+def create_thumbnail(filename):
+    """Returns encoded thumbnail bytes for an image file, or None if the original file is small enough to be sent as is."""
+
+    size = shared.opts.extra_networks_thumbnail_size
+    fmt = shared.opts.extra_networks_thumbnail_format
+
+    with Image.open(filename) as image:
+        if getattr(image, "is_animated", False) or max(image.size) <= size:
+            return None
+
+        image.thumbnail((size, size), images.LANCZOS)
+
+        if image.mode not in ("RGB", "RGBA") or (fmt == "JPEG" and image.mode == "RGBA"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=shared.opts.extra_networks_thumbnail_quality)
+
+    return buffer.getvalue()
+
+
+def get_thumbnail(filename):
+    """Returns a tuple of (key, data) for a thumbnail of the file, creating and caching it if needed.
+
+    data is None if the original file should be served instead of a thumbnail.
+    """
+
+    key = thumbnail_key(filename)
+    cache = get_cache()
+
+    data = cache.get(key)
+    if data is None:
+        data = create_thumbnail(filename) or b""
+        cache.set(key, data)
+
+    return key, data or None
+
+
+def queue_thumbnail(filename):
+    """Requests a thumbnail for the file to be created in background, so that it is ready when the browser asks for it."""
+
+    if not enabled() or not shared.opts.extra_networks_thumbnail_pregenerate:
+        return
+
+    with thumbnails_lock:
+        if filename in background_queued:
+            return
+        background_queued.add(filename)
+
+    def task():
+        try:
+            get_thumbnail(filename)
+        except Exception as e:
+            errors.display_once(e, f"creating thumbnail for {filename}")
+        finally:
+            with thumbnails_lock:
+                background_queued.discard(filename)
+
+    background_executor.submit(task)
+
+
+def thumbnail_response(filename, request=None):
+    """Returns a response with the thumbnail for the file, or None if the original file should be sent instead."""
+
+    from starlette.responses import Response
+
+    key, data = get_thumbnail(filename)
+    if data is None:
+        return None
+
+    # links to thumbnails include file's mtime and thumbnail settings, so a changed thumbnail always has a new URL
+    etag = etag_for_key(key)
+    headers = {"ETag": etag, "Cache-Control": "max-age=604800"}
+
+    if request is not None and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=data, media_type=thumbnail_formats[shared.opts.extra_networks_thumbnail_format], headers=headers)
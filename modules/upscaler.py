@@ -1,5 +1,8 @@
+import hashlib
 import os
+import threading
 from abc import abstractmethod
+from collections import OrderedDict
 
 import PIL
 from PIL import Image
@@ -11,6 +14,63 @@ LANCZOS = (Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.L
 NEAREST = (Image.Resampling.NEAREST if hasattr(Image, 'Resampling') else Image.NEAREST)
 
 
+class UpscaleCache:
+    """
+    Keeps recent upscaling results, so that upscaling same image with same upscaler again, which happens when redoing
+    hires fix or extras with changed settings of other steps, returns the result right away.
+
+    Images are identified by a digest of their pixel data. Least recently used results are removed when the number
+    of images or their total size exceeds limits from settings.
+    """
+
+    def __init__(self):
+        self.images = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        return shared.opts.upscaling_max_images_in_cache > 0 and shared.opts.upscaling_cache_size > 0
+
+    @staticmethod
+    def image_key(img: PIL.Image):
+        return hashlib.blake2b(img.tobytes(), digest_size=16).hexdigest(), img.size, img.mode
+
+    @staticmethod
+    def image_size(img: PIL.Image):
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key):
+        with self.lock:
+            img = self.images.get(key)
+            if img is None:
+                return None
+
+            self.images.move_to_end(key)
+
+        # caller may modify the image it gets
+        return img.copy()
+
+    def put(self, key, img: PIL.Image):
+        size_limit = shared.opts.upscaling_cache_size * 1024 * 1024
+        if self.image_size(img) > size_limit:
+            return
+
+        with self.lock:
+            if key in self.images:
+                self.size -= self.image_size(self.images.pop(key))
+
+            self.images[key] = img
+            self.size += self.image_size(img)
+
+            while self.size > size_limit or len(self.images) > shared.opts.upscaling_max_images_in_cache:
+                _, removed = self.images.popitem(last=False)
+                self.size -= self.image_size(removed)
+
+
+upscale_cache = UpscaleCache()
+
+
 class Upscaler:
     name = None
     model_path = None
@@ -22,6 +82,8 @@ class Upscaler:
     user_path = None
     scalers: list
     tile = True
+    cache_results = True
+    """whether results of upscale() are kept in upscale_cache; disabled for upscalers that are faster than computing the key"""
 
     def __init__(self, create_dirs=False):
         self.mod_pad_h = None
@@ -52,6 +114,13 @@ class Upscaler:
         return img
 
     def upscale(self, img: PIL.Image, scale, selected_model: str = None):
+        cache_key = None
+        if self.cache_results and upscale_cache.enabled():
+            cache_key = (upscale_cache.image_key(img), self.name, selected_model, scale)
+            cached = upscale_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         self.scale = scale
         dest_w = int((img.width * scale) // 8 * 8)
         dest_h = int((img.height * scale) // 8 * 8)
@@ -73,6 +142,9 @@ class Upscaler:
         if img.width != dest_w or img.height != dest_h:
             img = img.resize((int(dest_w), int(dest_h)), resample=LANCZOS)
 
+        if cache_key is not None and not shared.state.interrupted:
+            upscale_cache.put(cache_key, img.copy())
+
         return img
 
     @abstractmethod
@@ -108,6 +180,7 @@ class UpscalerData:
 class UpscalerNone(Upscaler):
     name = "None"
     scalers = []
+    cache_results = False
 
     def load_model(self, path):
         pass
@@ -122,6 +195,7 @@ class UpscalerNone(Upscaler):
 
 class UpscalerLanczos(Upscaler):
     scalers = []
+    cache_results = False
 
     def do_upscale(self, img, selected_model=None):
         return img.resize((int(img.width * self.scale), int(img.height * self.scale)), resample=LANCZOS)
@@ -137,6 +211,7 @@ class UpscalerLanczos(Upscaler):
 
 class UpscalerNearest(Upscaler):
     scalers = []
+    cache_results = False
 
     def do_upscale(self, img, selected_model=None):
         return img.resize((int(img.width * self.scale), int(img.height * self.scale)), resample=NEAREST)
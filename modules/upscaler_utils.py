@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import logging
 from typing import Callable
 
@@ -6,7 +8,7 @@ import torch
 import tqdm
 from PIL import Image
 
-from modules import devices, images, shared, torch_utils
+from modules import devices, shared, torch_utils
 
 logger = logging.getLogger(__name__)
 
@@ -62,30 +64,66 @@ def upscale_with_model(
         logger.debug("=> %s", output)
         return output
 
-    grid = images.split_grid(img, tile_size, tile_size, tile_overlap)
-    newtiles = []
-
-    with tqdm.tqdm(total=grid.tile_count, desc=desc, disable=not shared.opts.enable_upscale_progressbar) as p:
-        for y, h, row in grid.tiles:
-            newrow = []
-            for x, w, tile in row:
-                if shared.state.interrupted:
-                    return img
-                output = upscale_pil_patch(model, tile)
-                scale_factor = output.width // tile.width
-                newrow.append([x * scale_factor, w * scale_factor, output])
-                p.update(1)
-            newtiles.append([y * scale_factor, h * scale_factor, newrow])
-
-    newgrid = images.Grid(
-        newtiles,
-        tile_w=grid.tile_w * scale_factor,
-        tile_h=grid.tile_h * scale_factor,
-        image_w=grid.image_w * scale_factor,
-        image_h=grid.image_h * scale_factor,
-        overlap=grid.overlap * scale_factor,
-    )
-    return images.combine_grid(newgrid)
+    param = torch_utils.get_param(model)
+    tensor = pil_image_to_torch_bgr(img).unsqueeze(0).to(device=param.device, dtype=param.dtype)
+
+    with torch.no_grad(), devices.without_autocast():
+        output = tiled_upscale_2(
+            tensor,
+            model,
+            tile_size=tile_size,
+            tile_overlap=tile_overlap,
+            scale=None,
+            desc=desc,
+            device=param.device,
+        )
+
+    if shared.state.interrupted:
+        return img
+
+    return torch_bgr_to_pil_image(output)
+
+
+def tile_positions(size, tile_size, tile_overlap):
+    stride = max(1, tile_size - tile_overlap)
+    return list(range(0, size - tile_size, stride)) + [size - tile_size]
+
+
+def tile_ramp(size, overlap, device):
+    """returns (size,) weights for blending a tile with its neighbours along one axis, falling off linearly over overlap pixels at the edges"""
+
+    i = torch.arange(size, device=device, dtype=torch.float32)
+    return torch.clamp(torch.minimum(i + 1, size - i) / max(overlap, 1), max=1.0)
+
+
+def sum_of_ramps(size, positions, ramp):
+    """returns (size,) sum of weights of all tiles along one axis; a tile's weight is a product of weights along both axes, so this is enough to get total weight of any pixel"""
+
+    res = torch.zeros(size, device=ramp.device, dtype=torch.float32)
+    for pos in positions:
+        res[pos:pos + len(ramp)] += ramp
+
+    return res
+
+
+def tiles_batch_size(tile_size, scale, dtype):
+    """returns how many tiles to upscale at once, limited by settings and by an estimate of free memory"""
+
+    max_size = shared.opts.upscaler_tiles_batch_size
+    if max_size <= 1:
+        return 1
+
+    from modules import sd_hijack_optimizations
+
+    # models keep a few dozen feature channels at up to output resolution
+    element_size = torch.tensor([], dtype=dtype).element_size()
+    per_tile = (tile_size * (scale or 4)) ** 2 * 64 * 2 * element_size
+
+    return max(1, min(max_size, int(sd_hijack_optimizations.get_available_vram() * 0.8 // per_tile)))
+
+
+def is_out_of_memory_error(e):
+    return isinstance(e, torch.cuda.OutOfMemoryError) or "out of memory" in str(e).lower()
 
 
 def tiled_upscale_2(
@@ -94,14 +132,16 @@ def tiled_upscale_2(
     *,
     tile_size: int,
     tile_overlap: int,
-    scale: int,
+    scale: int | None,
     device: torch.device,
     desc="Tiled upscale",
 ):
-    # Alternative implementation of `upscale_with_model` originally used by
-    # SwinIR and ScuNET.  It differs from `upscale_with_model` in that tiling and
-    # weighting is done in PyTorch space, as opposed to `images.Grid` doing it in
-    # Pillow space without weighting.
+    """
+    Upscales img with model in overlapping tiles, several tiles per model call, blending overlaps with weights.
+
+    Only the output of one row of tiles is kept on device; rows that no more tiles overlap are normalized and moved
+    to the returned tensor, which is kept on CPU. If scale is None, it is found from the output of the model.
+    """
 
     b, c, h, w = img.size()
     tile_size = min(tile_size, h, w)
@@ -110,56 +150,74 @@ def tiled_upscale_2(
         logger.debug("Upscaling %s without tiling", img.shape)
         return model(img)
 
-    stride = tile_size - tile_overlap
-    h_idx_list = list(range(0, h - tile_size, stride)) + [h - tile_size]
-    w_idx_list = list(range(0, w - tile_size, stride)) + [w - tile_size]
-    result = torch.zeros(
-        b,
-        c,
-        h * scale,
-        w * scale,
-        device=device,
-        dtype=img.dtype,
-    )
-    weights = torch.zeros_like(result)
-    logger.debug("Upscaling %s to %s with tiles", img.shape, result.shape)
+    h_idx_list = tile_positions(h, tile_size, tile_overlap)
+    w_idx_list = tile_positions(w, tile_size, tile_overlap)
+    batch_size = tiles_batch_size(tile_size, scale, img.dtype)
+
+    result = None
+    band = None
+    band_top = 0
+
+    def flush(rows):
+        """normalizes the first rows of the band and moves them to result"""
+
+        part = band[:, :, :rows].float() / (weights_h[band_top:band_top + rows, None] * weights_w[None, :])
+        result[:, :, band_top:band_top + rows].copy_(part)
+
+    logger.debug("Upscaling %s with %d tiles, up to %d at once", img.shape, len(h_idx_list) * len(w_idx_list), batch_size)
     with tqdm.tqdm(total=len(h_idx_list) * len(w_idx_list), desc=desc, disable=not shared.opts.enable_upscale_progressbar) as pbar:
         for h_idx in h_idx_list:
-            if shared.state.interrupted or shared.state.skipped:
-                break
-
-            for w_idx in w_idx_list:
+            if band is not None:
+                # rows above this row of tiles will not change anymore
+                done = h_idx * scale - band_top
+                flush(done)
+                band = torch.cat([band[:, :, done:], torch.zeros_like(band[:, :, :done])], dim=2)
+                band_top += done
+
+            i = 0
+            while i < len(w_idx_list):
                 if shared.state.interrupted or shared.state.skipped:
                     break
 
-                # Only move this patch to the device if it's not already there.
-                in_patch = img[
-                    ...,
-                    h_idx : h_idx + tile_size,
-                    w_idx : w_idx + tile_size,
-                ].to(device=device)
+                batch_w_idx = w_idx_list[i:i + batch_size]
+
+                # Only move patches to the device if they're not already there.
+                in_patch = torch.cat([img[..., h_idx:h_idx + tile_size, w_idx:w_idx + tile_size] for w_idx in batch_w_idx]).to(device=device)
+
+                try:
+                    out_patch = model(in_patch)
+                except Exception as e:
+                    if len(batch_w_idx) <= 1 or not is_out_of_memory_error(e):
+                        raise
+
+                    batch_size = max(1, len(batch_w_idx) // 2)
+                    devices.torch_gc()
+                    continue
 
-                out_patch = model(in_patch)
+                if result is None:
+                    scale = scale or out_patch.shape[-1] // tile_size
+                    result = torch.zeros(b, out_patch.shape[1], h * scale, w * scale, device=devices.cpu, dtype=img.dtype)
+                    band = torch.zeros(b, out_patch.shape[1], tile_size * scale, w * scale, device=device, dtype=img.dtype)
+                    band_top = h_idx * scale
 
-                result[
-                    ...,
-                    h_idx * scale : (h_idx + tile_size) * scale,
-                    w_idx * scale : (w_idx + tile_size) * scale,
-                ].add_(out_patch)
+                    ramp = tile_ramp(tile_size * scale, tile_overlap * scale, device)
+                    mask = (ramp[:, None] * ramp[None, :]).to(img.dtype)
+                    weights_h = sum_of_ramps(h * scale, [x * scale for x in h_idx_list], ramp)
+                    weights_w = sum_of_ramps(w * scale, [x * scale for x in w_idx_list], ramp)
+                    logger.debug("Upscaling %s to %s with tiles", img.shape, result.shape)
 
-                out_patch_mask = torch.ones_like(out_patch)
+                for j, w_idx in enumerate(batch_w_idx):
+                    band[..., w_idx * scale:(w_idx + tile_size) * scale].add_(out_patch[j * b:(j + 1) * b] * mask)
 
-                weights[
-                    ...,
-                    h_idx * scale : (h_idx + tile_size) * scale,
-                    w_idx * scale : (w_idx + tile_size) * scale,
-                ].add_(out_patch_mask)
+                i += len(batch_w_idx)
+                pbar.update(len(batch_w_idx))
 
-                pbar.update(1)
+    if result is None:
+        return img
 
-    output = result.div_(weights)
+    flush(band.shape[2])
 
-    return output
+    return result
 
 
 def upscale_2(
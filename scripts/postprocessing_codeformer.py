@@ -1,7 +1,7 @@
 from PIL import Image
 import numpy as np
 
-from modules import scripts_postprocessing, codeformer_model, ui_components
+from modules import scripts_postprocessing, face_restoration_utils, codeformer_model, ui_components
 import gradio as gr
 
 
@@ -25,11 +25,13 @@ class ScriptPostprocessingCodeFormer(scripts_postprocessing.ScriptPostprocessing
         if codeformer_visibility == 0 or not enable:
             return
 
-        restored_img = codeformer_model.codeformer.restore(np.array(pp.image.convert("RGB"), dtype=np.uint8), w=codeformer_weight)
+        np_image = np.array(pp.image.convert("RGB"), dtype=np.uint8)
+        restored_img = codeformer_model.codeformer.restore(np_image, w=codeformer_weight)
         res = Image.fromarray(restored_img)
 
         if codeformer_visibility < 1.0:
             res = Image.blend(pp.image, res, codeformer_visibility)
+            face_restoration_utils.reuse_face_detection(np_image, np.array(res.convert("RGB"), dtype=np.uint8))
 
         pp.image = res
         pp.info["CodeFormer visibility"] = round(codeformer_visibility, 3)
@@ -1,7 +1,7 @@
 from PIL import Image
 import numpy as np
 
-from modules import scripts_postprocessing, gfpgan_model, ui_components
+from modules import scripts_postprocessing, face_restoration_utils, gfpgan_model, ui_components
 import gradio as gr
 
 
@@ -22,11 +22,13 @@ class ScriptPostprocessingGfpGan(scripts_postprocessing.ScriptPostprocessing):
         if gfpgan_visibility == 0 or not enable:
             return
 
-        restored_img = gfpgan_model.gfpgan_fix_faces(np.array(pp.image.convert("RGB"), dtype=np.uint8))
+        np_image = np.array(pp.image.convert("RGB"), dtype=np.uint8)
+        restored_img = gfpgan_model.gfpgan_fix_faces(np_image)
         res = Image.fromarray(restored_img)
 
         if gfpgan_visibility < 1.0:
             res = Image.blend(pp.image, res, gfpgan_visibility)
+            face_restoration_utils.reuse_face_detection(np_image, np.array(res.convert("RGB"), dtype=np.uint8))
 
         pp.image = res
         pp.info["GFPGAN visibility"] = round(gfpgan_visibility, 3)
@@ -1,7 +1,6 @@
 import re
 
 from PIL import Image
-import numpy as np
 
 from modules import scripts_postprocessing, shared
 import gradio as gr
@@ -9,8 +8,6 @@ import gradio as gr
 from modules.ui_components import FormRow, ToolButton, InputAccordion
 from modules.ui import switch_values_symbol
 
-upscale_cache = {}
-
 
 def limit_size_by_one_dimention(w, h, limit):
     if h > w and h > limit:
@@ -98,17 +95,8 @@ class ScriptPostprocessingUpscale(scripts_postprocessing.ScriptPostprocessing):
                 upscale_by = max(upscale_to_width/image.width, upscale_to_height/image.height)
                 info["Max side length"] = max_side_length
 
-        cache_key = (hash(np.array(image.getdata()).tobytes()), upscaler.name, upscale_mode, upscale_by,  upscale_to_width, upscale_to_height, upscale_crop)
-        cached_image = upscale_cache.pop(cache_key, None)
-
-        if cached_image is not None:
-            image = cached_image
-        else:
-            image = upscaler.scaler.upscale(image, upscale_by, upscaler.data_path)
-
-        upscale_cache[cache_key] = image
-        if len(upscale_cache) > shared.opts.upscaling_max_images_in_cache:
-            upscale_cache.pop(next(iter(upscale_cache), None), None)
+        # results are cached by the upscaler, see modules.upscaler.upscale_cache
+        image = upscaler.scaler.upscale(image, upscale_by, upscaler.data_path)
 
         if upscale_mode == 1 and upscale_crop:
             cropped = Image.new("RGB", (upscale_to_width, upscale_to_height))
@@ -162,9 +150,6 @@ class ScriptPostprocessingUpscale(scripts_postprocessing.ScriptPostprocessing):
 
         pp.image = upscaled_image
 
-    def image_changed(self):
-        upscale_cache.clear()
-
 
 class ScriptPostprocessingUpscaleSimple(ScriptPostprocessingUpscale):
     name = "Simple Upscale"
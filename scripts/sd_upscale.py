@@ -33,7 +33,6 @@ class Script(scripts.Script):
         p.extra_generation_params["SD upscale overlap"] = overlap
         p.extra_generation_params["SD upscale upscaler"] = upscaler.name
 
-        initial_info = None
         seed = p.seed
 
         init_img = p.init_images[0]
@@ -54,47 +53,67 @@ class Script(scripts.Script):
         p.do_not_save_grid = True
         p.do_not_save_samples = True
 
-        work = []
+        tiles = []
 
         for _y, _h, row in grid.tiles:
             for tiledata in row:
-                work.append(tiledata[2])
+                tiles.append(tiledata[2])
+
+        # tiles of all upscales are processed together, so that every batch except the last one is full; each tile
+        # keeps the seed it would get if every upscale was processed in batches of its own
+        subseed = p.subseed
+        work = []
+        for n in range(upscale_count):
+            for k, tile in enumerate(tiles):
+                i, j = divmod(k, batch_size)
+                tile_seed = seed + n + i + (j if p.subseed_strength == 0 else 0)
+                work.append((n, k, tile, tile_seed, subseed + j))
 
         batch_count = math.ceil(len(work) / batch_size)
-        state.job_count = batch_count * upscale_count
+        state.job_count = batch_count
 
         print(f"SD upscaling will process a total of {len(work)} images tiled as {len(grid.tiles[0][2])}x{len(grid.tiles)} per upscale in a total of {state.job_count} batches.")
 
+        # all tiles go through one process_images call, with tiles of each iteration encoded when it starts; the prompt
+        # is given for every tile so that the last batch can be smaller than the others
+        prompt = p.prompt
+        p.prompt = [prompt] * len(work)
+        p.init_images_batches = [[tile for _, _, tile, _, _ in work[i:i + batch_size]] for i in range(0, len(work), batch_size)]
+        p.init_images = p.init_images_batches[0]
+        p.seed = [tile_seed for _, _, _, tile_seed, _ in work]
+        p.subseed = [tile_subseed for _, _, _, _, tile_subseed in work]
+        p.n_iter = batch_count
+
+        try:
+            processed = processing.process_images(p)
+        finally:
+            p.init_images_batches = None
+            p.init_images = [init_img]
+            p.prompt = prompt
+            p.seed = seed
+            p.subseed = subseed
+            p.n_iter = 1
+
+        initial_info = processed.info
+
+        work_results = [[None] * len(tiles) for _ in range(upscale_count)]
+        for (n, k, _, _, _), image in zip(work, processed.images):
+            work_results[n][k] = image
+
         result_images = []
         for n in range(upscale_count):
-            start_seed = seed + n
-            p.seed = start_seed
-
-            work_results = []
-            for i in range(batch_count):
-                p.batch_size = batch_size
-                p.init_images = work[i * batch_size:(i + 1) * batch_size]
-
-                state.job = f"Batch {i + 1 + n * batch_count} out of {state.job_count}"
-                processed = processing.process_images(p)
-
-                if initial_info is None:
-                    initial_info = processed.info
-
-                p.seed = processed.seed + 1
-                work_results += processed.images
-
             image_index = 0
             for _y, _h, row in grid.tiles:
                 for tiledata in row:
-                    tiledata[2] = work_results[image_index] if image_index < len(work_results) else Image.new("RGB", (p.width, p.height))
+                    image = work_results[n][image_index]
+                    tiledata[2] = image if image is not None else Image.new("RGB", (p.width, p.height))
                     image_index += 1
 
             combined_image = images.combine_grid(grid)
             result_images.append(combined_image)
 
             if opts.samples_save:
-                images.save_image(combined_image, p.outpath_samples, "", start_seed, p.prompt, opts.samples_format, info=initial_info, p=p)
+                images.save_image(combined_image, p.outpath_samples, "", seed + n, p.prompt, opts.samples_format, info=initial_info, p=p)
 
         processed = Processed(p, result_images, seed, initial_info)
 
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+test_files_path = os.path.dirname(__file__) + "/test_files"
+
+
+def make_request(headers):
+    from starlette.requests import Request
+
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(k.encode(), v.encode()) for k, v in headers.items()]})
+
+
+@pytest.mark.usefixtures("initialize")
+def test_fetch_preview_etag(monkeypatch):
+    from modules import shared, ui_extra_networks
+
+    monkeypatch.setitem(shared.opts.data, "extra_networks_thumbnail_size", 0)
+    monkeypatch.setattr(ui_extra_networks, "allowed_dirs", {test_files_path})
+    filename = os.path.join(test_files_path, "img2img_basic.png")
+
+    response = ui_extra_networks.fetch_file(make_request({}), filename)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = ui_extra_networks.fetch_file(make_request({"if-none-match": etag}), filename)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = ui_extra_networks.fetch_file(make_request({"if-none-match": '"something else"'}), filename)
+    assert response.status_code == 200
@@ -1,3 +1,4 @@
+import pytest
 import requests
 
 
@@ -33,3 +34,23 @@ def test_interrogate_performed(base_url, img2img_basic_image_base64):
         "model": "clip",
     }
     assert requests.post(f"{base_url}/sdapi/v1/extra-single-image", json=payload).status_code == 200
+
+
+@pytest.mark.usefixtures("initialize")
+def test_skip_finished_inputs_matches_exact_names(tmp_path):
+    from modules import postprocessing
+
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+
+    cat, cat_2 = str(input_dir / "cat.png"), str(input_dir / "cat-2.png")
+    data_to_process = [(cat, cat), (cat_2, cat_2)]
+
+    assert postprocessing.skip_finished_inputs(data_to_process, str(output_dir)) == data_to_process
+
+    postprocessing.mark_input_finished(str(output_dir), cat_2)
+    assert postprocessing.skip_finished_inputs(data_to_process, str(output_dir)) == [(cat, cat)]
+
+    postprocessing.mark_input_finished(str(output_dir), cat)
+    assert postprocessing.skip_finished_inputs(data_to_process, str(output_dir)) == []
@@ -27,3 +27,28 @@ def test_face_restorers(restorer_name):
     assert fixed_image.shape == np_img.shape
     assert not np.allclose(fixed_image, np_img)  # should have visibly changed
     Image.fromarray(fixed_image).save(os.path.join(test_outputs_path, f"{restorer_name}.png"))
+
+
+@pytest.mark.usefixtures("initialize")
+def test_codeformer_reuses_gfpgan_face_detection(monkeypatch):
+    from facexlib.utils.face_restoration_helper import FaceRestoreHelper
+
+    from modules import codeformer_model, face_restoration_utils, gfpgan_model, shared
+
+    gfpgan_model.setup_model(shared.cmd_opts.gfpgan_models_path)
+    codeformer_model.setup_model(shared.cmd_opts.codeformer_models_path)
+
+    np_img = np.array(Image.open(os.path.join(test_files_path, "two-faces.jpg")), dtype=np.uint8)
+    face_restoration_utils.detection_cache.clear()
+    gfpgan_img = gfpgan_model.gfpgan_fix_faces(np_img)
+
+    # faces detected in GFPGAN's input are used for its output, and for the output blended with the input
+    blended_img = np.array(Image.blend(Image.fromarray(np_img), Image.fromarray(gfpgan_img), 0.5))
+    face_restoration_utils.reuse_face_detection(np_img, blended_img)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("faces were detected again")
+
+    monkeypatch.setattr(FaceRestoreHelper, "get_face_landmarks_5", fail)
+    for img in [gfpgan_img, blended_img]:
+        assert codeformer_model.codeformer.restore(img).shape == np_img.shape
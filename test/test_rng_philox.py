@@ -0,0 +1,32 @@
+import numpy as np
+
+from modules import rng_philox
+
+
+def test_randn_matches_reference():
+    g = rng_philox.Generator(seed=0)
+
+    expected = [
+        [-0.92466259, -0.42534415, -2.6438457, 0.14518388],
+        [-0.12086647, -0.57972564, -0.62285122, -0.32838709],
+        [-1.07454231, -0.36314407, -1.67105067, 2.26550497],
+    ]
+
+    assert np.allclose(g.randn(shape=(3, 4)), expected)
+
+
+def test_randn_batch_matches_single_generators():
+    seeds = [0, 1, 12345, 2**32 - 1]
+    shape = (4, 8, 8)
+
+    single = [rng_philox.Generator(seed) for seed in seeds]
+    batched = [rng_philox.Generator(seed) for seed in seeds]
+
+    for _ in range(3):
+        expected = np.stack([g.randn(shape) for g in single])
+        actual = rng_philox.randn_batch(batched, shape)
+
+        assert actual.shape == (len(seeds), *shape)
+        assert np.array_equal(actual, expected)
+
+    assert [g.offset for g in batched] == [3] * len(seeds)
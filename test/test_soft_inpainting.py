@@ -0,0 +1,47 @@
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pytest
+
+script_path = os.path.join(os.path.dirname(__file__), "..", "extensions-builtin", "soft-inpainting", "scripts", "soft_inpainting.py")
+
+
+@pytest.fixture(scope="module")
+def soft_inpainting():
+    spec = importlib.util.spec_from_file_location("soft_inpainting", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("percentile_min, percentile_max, min_width", [(0.9, 1, 1), (0.25, 0.75, 1), (0, 1, 0.1), (0.5, 0.5, 3)])
+def test_weighted_histogram_filter_matches_reference(soft_inpainting, percentile_min, percentile_max, min_width):
+    kernel, kernel_center = soft_inpainting.get_gaussian_kernel(stddev_radius=1.5, max_radius=2)
+
+    img = np.random.default_rng(0).random((13, 21)).astype(np.float32)
+    img[img < 0.3] = 0.5  # equal values in the same window
+
+    expected = soft_inpainting.weighted_histogram_filter_reference(img, kernel, kernel_center, percentile_min, percentile_max, min_width)
+    actual = soft_inpainting.weighted_histogram_filter(img, kernel, kernel_center, percentile_min, percentile_max, min_width)
+
+    assert actual.dtype == expected.dtype
+    assert np.allclose(actual, expected, atol=1e-6)
+
+
+def test_weighted_histogram_filter_is_faster_than_reference(soft_inpainting):
+    kernel, kernel_center = soft_inpainting.get_gaussian_kernel(stddev_radius=1.5, max_radius=2)
+    img = np.random.default_rng(0).random((64, 64)).astype(np.float32)
+
+    results = {}
+    timings = {}
+    for fn in [soft_inpainting.weighted_histogram_filter_reference, soft_inpainting.weighted_histogram_filter]:
+        t0 = time.perf_counter()
+        results[fn] = fn(img, kernel, kernel_center, percentile_min=0.9, percentile_max=1, min_width=1)
+        timings[fn] = time.perf_counter() - t0
+
+    assert np.allclose(results[soft_inpainting.weighted_histogram_filter], results[soft_inpainting.weighted_histogram_filter_reference], atol=1e-6)
+
+    # the vectorized version is typically more than an order of magnitude faster; only a loose bound is checked
+    assert timings[soft_inpainting.weighted_histogram_filter] * 2 < timings[soft_inpainting.weighted_histogram_filter_reference]